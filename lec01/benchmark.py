@@ -0,0 +1,319 @@
+# python benchmark.py [compare] [input_file ...]
+# python benchmark.py generate output_file [--count=N] [--lengths=L] [--seed=S]
+# python benchmark.py scale [--counts=N,N,...] [--lengths=L] [--seed=S]
+#                           [--methods=M,M,...] [--output=results.json]
+#
+# compare (引数がなければこれ):
+#   hw2の探索方法(元のfilter/nextの線形探索、letter_maskで絞り込む線形探索、
+#   AnagramTrie、VectorMatcher)の実行時間をsmall/medium/large.txtで比べる。
+#   答えが同じことも確認する。
+#   letter_maskの絞り込みで、26文字の比較をいくつ省けたかも表示する。
+#
+# generate:
+#   small/medium/large.txtのような入力ファイルを、乱数のシードを決めて作る。
+#   文字はwords.txtでの出現頻度に合わせて選ぶ。
+#   --lengths は単語の長さの分布で、次のどれか
+#     16          すべて16文字
+#     10-36       10〜36文字から一様に選ぶ
+#     16:3,36:1   16文字と36文字を3:1の割合で選ぶ
+#
+# scale:
+#   --countsの語数の入力を作って、hw1のanagram_algoとhw2の探索を、
+#   辞書の読み込み・インデックスの作成・1語ごとの探索に分けて計測し、
+#   結果をJSONで書き出す。入力はファイルに書かずに少しずつ作るので、
+#   10^7語でもメモリは増えない。
+
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import hw1
+import hw2
+
+INPUT_FILES = ["small.txt", "medium.txt", "large.txt"]
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+# scaleで一度に作って探索する語数
+CHUNK_SIZE = 10000
+
+
+def read_vectors(input_file: str) -> list:
+    with open(input_file) as f:
+        return [hw2.to_vector(word.strip()) for word in f]
+
+
+# methodで全部の入力を探索して、(かかった秒数, 答えのリスト)を返す。
+# 木や行列を作る時間も含める。
+def time_method(vecs: list, dictionary: hw2.CompactDictionary, method: str) -> tuple:
+    start = time.perf_counter()
+    results = hw2.best_anagrams(vecs, dictionary, method)
+    return time.perf_counter() - start, results
+
+
+def available_methods() -> list:
+    methods = ["linear", "masked", "trie"]
+    if hw2.np is not None:
+        methods.append("numpy")
+    return methods
+
+
+def compare(input_files: list) -> None:
+    dictionary = hw2.load_dictionary()
+    methods = available_methods()
+    if hw2.np is None:
+        print("numpy is not installed; skipping the numpy matcher")
+
+    print("%-12s" % "input" + "".join("%12s" % method for method in methods))
+    for input_file in input_files:
+        vecs = read_vectors(input_file)
+        row = "%-12s" % input_file
+        expected = None
+        for method in methods:
+            seconds, results = time_method(vecs, dictionary, method)
+            if expected is None:
+                expected = results
+            assert results == expected, "%s returned different answers" % method
+            row += "%11.3fs" % seconds
+        print(row)
+
+    print()
+    print_mask_savings(dictionary, input_files)
+
+
+# letter_maskの絞り込みで省けた、26文字の比較の数を表示する
+def print_mask_savings(dictionary: hw2.CompactDictionary, input_files: list) -> None:
+    masks = dictionary.masks
+    print("%-12s%14s%14s%10s" % ("input", "candidates", "compares", "saved"))
+    for input_file in input_files:
+        stats = [0, 0]  # [マスクで除いた数, 26文字の比較をした数]
+        for vec in read_vectors(input_file):
+            hw2.find_anagram_masked(vec, dictionary, masks, stats)
+        # マスクがなければ、見た単語すべてで26文字の比較をしていた
+        candidates = stats[0] + stats[1]
+        print(
+            "%-12s%14d%14d%9.1f%%"
+            % (
+                input_file,
+                candidates,
+                stats[1],
+                100 * stats[0] / candidates if candidates else 0.0,
+            )
+        )
+
+
+# "16", "10-36", "16:3,36:1" の形の長さの分布を (長さのリスト, 重みのリスト) にする
+def parse_lengths(spec: str) -> tuple:
+    if ":" in spec:
+        lengths, weights = [], []
+        for part in spec.split(","):
+            length, weight = part.split(":")
+            lengths.append(int(length))
+            weights.append(float(weight))
+        return lengths, weights
+    if "-" in spec:
+        low, high = spec.split("-")
+        lengths = list(range(int(low), int(high) + 1))
+        return lengths, [1.0] * len(lengths)
+    return [int(spec)], [1.0]
+
+
+# words.txtの中の文字の出現回数を、文字を選ぶときの重みにする
+def letter_weights(words_file: str = hw2.WORDS_FILE) -> list:
+    counts = [0] * 26
+    with open(words_file) as f:
+        for word in f:
+            for i, count in enumerate(hw2.to_vector(word.strip())):
+                counts[i] += count
+    return counts
+
+
+# 入力の単語をcount個作る。同じseedなら同じ単語が同じ順番で出てくる。
+def generate_words(count: int, lengths: str = "16", seed: int = 0):
+    rng = random.Random(seed)
+    length_values, length_weights = parse_lengths(lengths)
+    weights = letter_weights()
+    for _ in range(count):
+        length = rng.choices(length_values, length_weights)[0]
+        yield "".join(rng.choices(LETTERS, weights, k=length))
+
+
+def generate(output_file: str, count: int, lengths: str, seed: int) -> None:
+    with open(output_file, "w") as f:
+        for word in generate_words(count, lengths, seed):
+            f.write(word + "\n")
+
+
+# generate_wordsの単語をsize語ずつのリストにして返す
+def chunks(words, size: int = CHUNK_SIZE):
+    chunk = []
+    for word in words:
+        chunk.append(word)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# 1語ごとの時間のリストから、平均・p50・p99をマイクロ秒で返す
+def latency_summary(latencies: list, total_seconds: float, count: int) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "count": count,
+        "total_s": total_seconds,
+        "words_per_sec": count / total_seconds if total_seconds > 0 else 0.0,
+        "mean_us": total_seconds / count * 1e6 if count else 0.0,
+        "p50_us": hw1.percentile(latencies, 50) * 1e6 if latencies else None,
+        "p99_us": hw1.percentile(latencies, 99) * 1e6 if latencies else None,
+    }
+
+
+# hw1: インデックスを作る時間・キャッシュから読み込む時間・1語ごとの時間
+def bench_hw1(counts: list, lengths: str, seed: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        index_file = os.path.join(tmp, "words_index.pickle")
+        start = time.perf_counter()
+        hw1.load_index(hw1.WORDS_FILE, index_file)  # キャッシュがないので作る
+        built = time.perf_counter()
+        index = hw1.load_index(hw1.WORDS_FILE, index_file)
+        loaded = time.perf_counter()
+
+    runs = []
+    for count in counts:
+        rng = random.Random(seed)
+        latencies = []
+        total = 0.0
+        seen = 0
+        for words in chunks(generate_words(count, lengths, seed)):
+            for word in words:
+                query_start = time.perf_counter()
+                hw1.anagram_algo(word, index)
+                latency = time.perf_counter() - query_start
+                total += latency
+                seen += 1
+                hw1.add_sample(latencies, latency, seen, rng)
+        stats = latency_summary(latencies, total, count)
+        stats["lengths"] = lengths
+        runs.append(stats)
+        print(
+            "hw1        %9d words: %.0f words/s, p50 %.2fus, p99 %.2fus"
+            % (count, stats["words_per_sec"], stats["p50_us"], stats["p99_us"])
+        )
+    return {
+        "index_build_s": built - start,
+        "index_load_s": loaded - built,
+        "runs": runs,
+    }
+
+
+# hw2: 辞書を作る時間・キャッシュから読み込む時間、methodごとの
+# インデックスを作る時間と1語ごとの時間
+def bench_hw2(counts: list, lengths: str, seed: int, methods: list) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_file = os.path.join(tmp, "words.dict")
+        start = time.perf_counter()
+        hw2.load_dictionary(hw2.WORDS_FILE, cache_file)  # キャッシュがないので作る
+        built = time.perf_counter()
+        dictionary = hw2.load_dictionary(hw2.WORDS_FILE, cache_file)
+        loaded = time.perf_counter()
+
+    result = {
+        "dictionary_build_s": built - start,
+        "dictionary_load_s": loaded - built,
+        "methods": {},
+        "runs": [],
+    }
+    for method in methods:
+        start = time.perf_counter()
+        matcher = hw2.make_matcher(dictionary, method)
+        result["methods"][method] = {"index_build_s": time.perf_counter() - start}
+
+        for count in counts:
+            rng = random.Random(seed)
+            latencies = []  # numpyはまとめて探索するので、1語ごとの時間はない
+            total = 0.0
+            seen = 0
+            for words in chunks(generate_words(count, lengths, seed)):
+                vecs = [hw2.to_vector(word) for word in words]
+                if method == "numpy":
+                    chunk_start = time.perf_counter()
+                    matcher(vecs)
+                    total += time.perf_counter() - chunk_start
+                    continue
+                for vec in vecs:
+                    query_start = time.perf_counter()
+                    matcher([vec])
+                    latency = time.perf_counter() - query_start
+                    total += latency
+                    seen += 1
+                    hw1.add_sample(latencies, latency, seen, rng)
+            stats = latency_summary(latencies, total, count)
+            stats["method"] = method
+            stats["lengths"] = lengths
+            result["runs"].append(stats)
+            print(
+                "hw2 %-6s %9d words: %.0f words/s, mean %.2fus"
+                % (method, count, stats["words_per_sec"], stats["mean_us"])
+                + (
+                    ", p50 %.2fus, p99 %.2fus" % (stats["p50_us"], stats["p99_us"])
+                    if latencies
+                    else ""
+                )
+            )
+    return result
+
+
+def scale(counts: list, lengths: str, seed: int, methods: list, output: str) -> None:
+    results = {
+        "config": {
+            "counts": counts,
+            "lengths": lengths,
+            "seed": seed,
+            "methods": methods,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "hw1": bench_hw1(counts, lengths, seed),
+        "hw2": bench_hw2(counts, lengths, seed, methods),
+    }
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print("Wrote %s" % output)
+
+
+# --name=value の形のオプションを辞書にする
+def parse_options(argv: list) -> tuple:
+    args = []
+    options = {}
+    for arg in argv:
+        if arg.startswith("--") and "=" in arg:
+            name, value = arg[2:].split("=", 1)
+            options[name] = value
+        else:
+            args.append(arg)
+    return args, options
+
+
+if __name__ == "__main__":
+    args, options = parse_options(sys.argv[1:])
+    command = "compare"
+    if args and args[0] in ("compare", "generate", "scale"):
+        command = args.pop(0)
+
+    lengths = options.get("lengths", "16")
+    seed = int(options.get("seed", "0"))
+    if command == "generate":
+        if len(args) != 1:
+            print("Usage: python benchmark.py generate output_file [--count=N]")
+            sys.exit(1)
+        generate(args[0], int(options.get("count", "10000")), lengths, seed)
+    elif command == "scale":
+        counts = [int(n) for n in options.get("counts", "10000,100000").split(",")]
+        methods = options.get("methods", ",".join(available_methods())).split(",")
+        output = options.get("output", "benchmark_results.json")
+        scale(counts, lengths, seed, methods, output)
+    else:
+        compare(args or INPUT_FILES)
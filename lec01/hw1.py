@@ -1,66 +1,160 @@
 # 問題：与えられた文字列のアナグラムを列挙する
 
-# words.txtの辞書の単語をソートする。
-sort_words_dict = []  # ここにソートした単語と、元の単語を追加していく
-with open("words.txt") as dictionary:
-    for word in dictionary:
-        word = word.strip()
-        sorted_word = "".join(sorted(word))
-        sort_words_dict.append(
-            (sorted_word, word)
-        )  # ソートした単語と、そのままの単語を持たせる
+import os
+import pickle
+import random
+import sys
+import time
 
-sort_words_dict.sort()  # これを、ソートした単語のアルファベット順にまたソートする
+WORDS_FILE = "words.txt"
+INDEX_FILE = "words_index.pickle"  # words.txtから作ったインデックスの保存先
 
 
-def anagram_algo(word: str, sort_words_dict: list) -> list:
+# words.txtの単語を、ソートした単語 -> 元の単語のリスト という辞書にまとめる。
+def build_index(words_file: str) -> dict:
+    index = {}
+    with open(words_file) as dictionary:
+        for word in dictionary:
+            word = word.strip()
+            sorted_word = "".join(sorted(word))
+            # 同じソート結果を持つ単語は同じリストに追加していく
+            index.setdefault(sorted_word, []).append(word)
+    for anagram_words in index.values():
+        anagram_words.sort()  # 元の実装と同じく、アルファベット順に並べておく
+    return index
+
+
+# インデックスをファイルに保存しておき、次回からは読み込むだけにする。
+# words.txtのサイズと更新時刻も一緒に保存しておき、それが変わっていたら作り直す。
+def load_index(words_file: str = WORDS_FILE, index_file: str = INDEX_FILE) -> dict:
+    stat = os.stat(words_file)
+    source = (stat.st_size, stat.st_mtime_ns)  # words.txtが変わったかどうかの目印
+
+    try:
+        with open(index_file, "rb") as f:
+            saved_source, index = pickle.load(f)
+        if saved_source == source:
+            return index
+    except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+        pass  # ファイルがない・壊れている場合は作り直す
+
+    index = build_index(words_file)
+    # 書き込み途中で落ちても壊れたファイルが残らないよう、一時ファイルに書いてから置き換える
+    tmp_file = index_file + ".tmp"
+    with open(tmp_file, "wb") as f:
+        pickle.dump((source, index), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, index_file)
+    return index
+
+
+def anagram_algo(word: str, index: dict) -> list:
     sorted_given_word = "".join(sorted(word))  # 入力された単語をソートする
-    anagram_words = []  # アナグラムを保持するリスト
-
-    """
-    ２部探索
-    sort_words_dict[left][0] < sorted(given_word) <= sort_words_dict[right][0] を保ちながら right - left を小さくしていく
-    最終的に、sort_words_dict[left][0] < sorted(given_word) <= sort_words_dict[left + 1][0]になる。
-    right = left+1が、該当する区間の開始地点になる。
-    """
-    left = 0
-    right = len(sort_words_dict) - 1
-
-    # 指定されたものが範囲外にあった場合空のリストを返す
-    if (
-        sort_words_dict[right][0] < sorted_given_word
-        or sort_words_dict[left][0] > sorted_given_word
-    ):
-        return []
-
-    while right != left + 1:
-        middle = (left + right) // 2
-        if sorted_given_word <= sort_words_dict[middle][0]:
-            right = middle
-        else:
-            left = middle
-
-        # indexが0の場合も含まれるとき、indexを0にセット(ここでは'a'が0番目の単語)
-        if sort_words_dict[0][0] == sorted_given_word:
-            index = 0
-        else:
-            index = right
-    # 開始地点のindexから、ソートした単語が一致しているところまでindexを増やしていく
-    while (
-        index < len(sort_words_dict) and sort_words_dict[index][0] == sorted_given_word
-    ):
-        anagram_words.append(sort_words_dict[index][1])
-        index += 1  # 次の単語を確認
-
-    return anagram_words  # アナグラムを保持したリストを返す
-
-
-input_word = input("Input a word\n")  # 1つの単語の入力を指示
-
-anagram_words = anagram_algo(input_word, sort_words_dict)
-if len(anagram_words) > 0:
-    print("anagrams: ")
-    for anagram_word in anagram_words:
-        print(anagram_word)
-else:
-    print("No anagrams")  # アナグラムが1つもない
+    # ソートした単語をキーにすれば、辞書からO(1)でアナグラムのリストが取り出せる
+    return list(index.get(sorted_given_word, []))
+
+
+# p50/p99を計算するために保存しておくレイテンシの最大数
+# (何百万語流しても、メモリ使用量がこれ以上増えないようにする)
+LATENCY_SAMPLES = 100000
+
+
+# パーセンタイルを求める。samplesはソート済みであること
+def percentile(samples: list, p: float) -> float:
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+# count個目の値valueを、リザーバーサンプリングでsamplesに入れる。
+# count個の中から、LATENCY_SAMPLES個が一様に選ばれるようになる。
+def add_sample(samples: list, value: float, count: int, rng: random.Random) -> None:
+    if len(samples) < LATENCY_SAMPLES:
+        samples.append(value)
+    else:
+        j = rng.randrange(count)
+        if j < LATENCY_SAMPLES:
+            samples[j] = value
+
+
+# 入力の単語を1行ずつ読んで、アナグラムを見つけたらすぐに書き出していく。
+# 出力は「入力単語 アナグラム1 アナグラム2 ...」の形式で1行ずつ。
+# レイテンシはリザーバーサンプリングでLATENCY_SAMPLES個までしか保持しない。
+def run_batch(index: dict, input_stream, output_stream) -> dict:
+    rng = random.Random(0)
+    latencies = []
+    count = 0
+    start = time.perf_counter()
+    for line in input_stream:
+        word = line.strip()
+        if not word:
+            continue
+        query_start = time.perf_counter()
+        anagram_words = anagram_algo(word, index)
+        latency = time.perf_counter() - query_start
+        output_stream.write(" ".join([word] + anagram_words) + "\n")
+
+        count += 1
+        add_sample(latencies, latency, count, rng)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "words": count,
+        "seconds": elapsed,
+        "words_per_sec": count / elapsed if elapsed > 0 else 0.0,
+        "p50_us": percentile(latencies, 50) * 1e6,
+        "p99_us": percentile(latencies, 99) * 1e6,
+    }
+
+
+# "-" のときは標準入出力を使う
+def open_stream(path: str, mode: str):
+    if path == "-":
+        return sys.stdin if "r" in mode else sys.stdout
+    return open(path, mode)
+
+
+def batch_main(argv: list) -> None:
+    input_file = argv[0] if len(argv) > 0 else "-"
+    output_file = argv[1] if len(argv) > 1 else "-"
+    index = load_index()
+    input_stream = open_stream(input_file, "r")
+    output_stream = open_stream(output_file, "w")
+    try:
+        stats = run_batch(index, input_stream, output_stream)
+    finally:
+        if input_stream is not sys.stdin:
+            input_stream.close()
+        if output_stream is not sys.stdout:
+            output_stream.close()
+    # 結果と混ざらないよう、統計は標準エラー出力に出す
+    print(
+        "words: %d  time: %.2fs  words/sec: %.0f  p50: %.2fus  p99: %.2fus"
+        % (
+            stats["words"],
+            stats["seconds"],
+            stats["words_per_sec"],
+            stats["p50_us"],
+            stats["p99_us"],
+        ),
+        file=sys.stderr,
+    )
+
+
+# python hw1.py                          1つの単語を入力して答える
+# python hw1.py --batch large.txt out.txt ファイルの単語をまとめて処理する ("-"で標準入出力)
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        batch_main(sys.argv[2:])
+        sys.exit(0)
+
+    index = load_index()
+    input_word = input("Input a word\n")  # 1つの単語の入力を指示
+
+    anagram_words = anagram_algo(input_word, index)
+    if len(anagram_words) > 0:
+        print("anagrams: ")
+        for anagram_word in anagram_words:
+            print(anagram_word)
+    else:
+        print("No anagrams")  # アナグラムが1つもない
@@ -6,8 +6,18 @@
 # アナグラムをoutputファイルに出力する。単語をすべて使う必要はない。
 
 
+import heapq
+import multiprocessing
+import os
+import struct
 import sys
 import time
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # numpyがない環境では、maskedで探す
+    np = None
 
 # SCORES of the characters:
 # ----------------------------------------
@@ -20,18 +30,7 @@ import time
 
 SCORES = [1, 3, 2, 2, 1, 3, 3, 1, 1, 4, 4, 2, 2, 1, 1, 3, 4, 1, 1, 1, 2, 3, 3, 4, 3, 4]
 
-
-class Dictionary:
-    def __init__(self, word, word_vec, score):
-        """
-        クラスの初期化メソッド
-        :param word: 単語 (str)
-        :param word_vec: 単語のベクトル (tuple)
-        :param score: 単語のスコア (int)
-        """
-        self.word = word  # 単語
-        self.word_vec = word_vec  # 単語のベクトル
-        self.score = score  # 単語のスコア
+WORDS_FILE = "words.txt"
 
 
 # スコアの計算
@@ -52,57 +51,712 @@ def to_vector(word: str) -> tuple:
     )  # リストよりもtuple(組み合わせ)の方がメモリ使用量が少ないらしいので、tupleにして返す
 
 
-def is_word_anagram(word_vec: tuple, word_dict_tuple: tuple) -> bool:
+def is_word_anagram(word_vec: tuple, dict_word_vec: bytes) -> bool:
     # 単語ベクトルが辞書の単語ベクトルを包含しているかを確認
 
     for i in range(26):
-        if word_vec[i] < word_dict_tuple.word_vec[i]:
+        if word_vec[i] < dict_word_vec[i]:
             return False
     return True
 
 
-# 引数の確認
-if len(sys.argv) < 3:
-    print("Usage: python hw2.py (input_file).txt (output_file).txt")
-    sys.exit(1)
+# 単語ベクトルで使われている文字を、26ビットの整数で表す (aが1ビット目)
+def letter_mask(word_vec: tuple) -> int:
+    mask = 0
+    for i in range(26):
+        if word_vec[i]:
+            mask |= 1 << i
+    return mask
+
+
+class CompactDictionary:
+    """
+    辞書の単語を、単語ごとのオブジェクトを作らずにいくつかの配列にまとめて持つ。
+    (単語ごとにオブジェクトと26個のintのtupleを作ると、1単語で数百バイトになる)
+
+    単語はスコアが大きい順(同じスコアならwords.txtの順)に並んでいて、
+    配列の中の位置(順位)で単語を指す。
+    - counts: 単語ベクトルを26バイトずつ並べたbytes
+    - scores: 単語のスコアのarray('H')
+    - masks: 単語のletter_maskのarray('I')
+    - offsets: words_bufferの中で単語が始まる位置のarray('I') (単語数 + 1個)
+    - words_buffer: 単語をつなげたbytes
+    """
+
+    MAGIC = b"ANGD"
+    # マジック, 単語数, words_bufferの長さ, 元のファイルのサイズ, 元のファイルの更新時刻
+    HEADER = struct.Struct("<4sIIqq")
+
+    def __init__(self, counts, scores, masks, offsets, words_buffer):
+        self.counts = counts
+        self.scores = scores
+        self.masks = masks
+        self.offsets = offsets
+        self.words_buffer = words_buffer
+
+    # 単語のリストから作る
+    @classmethod
+    def from_words(cls, words: list):
+        vecs = [to_vector(word) for word in words]
+        word_scores = [score(vec) for vec in vecs]
+        # スコアが大きい順にソートする (sortedは安定なので、同じスコアは元の順番)
+        order = sorted(range(len(words)), key=lambda i: -word_scores[i])
+
+        counts = bytearray()
+        offsets = array("I", [0])
+        words_buffer = bytearray()
+        for i in order:
+            counts += bytes(vecs[i])
+            words_buffer += words[i].encode()
+            offsets.append(len(words_buffer))
+        return cls(
+            bytes(counts),
+            array("H", [word_scores[i] for i in order]),
+            array("I", [letter_mask(vecs[i]) for i in order]),
+            offsets,
+            bytes(words_buffer),
+        )
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    # 順位rankの単語
+    def word(self, rank: int) -> str:
+        return self.words_buffer[self.offsets[rank] : self.offsets[rank + 1]].decode()
+
+    # 順位rankの単語ベクトル。26バイトのbytesで、tupleと同じように添字で読める
+    def vector(self, rank: int) -> bytes:
+        return self.counts[26 * rank : 26 * rank + 26]
+
+    def score(self, rank: int) -> int:
+        return self.scores[rank]
+
+    # ファイルに保存する。sourceには元の単語ファイルの(サイズ, 更新時刻)を入れておく
+    def save(self, path: str, source: tuple = (0, 0)) -> None:
+        arrays = [self.scores, self.masks, self.offsets]
+        if sys.byteorder == "big":  # ファイルの中はリトルエンディアンに揃える
+            arrays = [array(a.typecode, a) for a in arrays]
+            for a in arrays:
+                a.byteswap()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(
+                self.HEADER.pack(self.MAGIC, len(self), len(self.words_buffer), *source)
+            )
+            for a in arrays:
+                f.write(a.tobytes())
+            f.write(self.counts)
+            f.write(self.words_buffer)
+        os.replace(tmp_path, path)
+
+    # saveで保存したファイルを読み込んで、(source, 辞書)を返す
+    @classmethod
+    def load(cls, path: str) -> tuple:
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, count, words_length, *source = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC:
+            raise ValueError("%s is not a dictionary file" % path)
+
+        position = cls.HEADER.size
+        arrays = []
+        for typecode, length in (("H", count), ("I", count), ("I", count + 1)):
+            a = array(typecode)
+            size = a.itemsize * length
+            a.frombytes(data[position : position + size])
+            if sys.byteorder == "big":
+                a.byteswap()
+            arrays.append(a)
+            position += size
+        counts = data[position : position + 26 * count]
+        position += 26 * count
+        words_buffer = data[position : position + words_length]
+        if len(words_buffer) != words_length:
+            raise ValueError("%s is truncated" % path)
+        return tuple(source), cls(counts, *arrays, words_buffer)
+
+
+# 辞書を読み込む。一度読み込んだ辞書はcache_file(省略するとwords_fileの
+# 拡張子を.dictにしたもの)に保存しておき、words_fileが変わっていなければ
+# 次からはそちらを読み込む。
+def load_dictionary(words_file: str = WORDS_FILE, cache_file: str = None):
+    if cache_file is None:
+        cache_file = os.path.splitext(words_file)[0] + ".dict"
+    stat = os.stat(words_file)
+    source = (stat.st_size, stat.st_mtime_ns)  # words_fileが変わったかどうかの目印
 
+    try:
+        saved_source, dictionary = CompactDictionary.load(cache_file)
+        if saved_source == source:
+            return dictionary
+    except (OSError, ValueError, struct.error):
+        pass  # ファイルがない・壊れている場合は作り直す
 
-start = time.perf_counter()
-with open("words.txt") as dictionary:
-    dict_tuple = []
-    for word in dictionary:
-        word = word.strip()
-        vec = to_vector(word)
-        word_score = score(vec)
-        dict_tuple.append(
-            Dictionary(word, vec, word_score)
-        )  # 単語、単語の出現回数ベクトルを保持
+    with open(words_file) as f:
+        dictionary = CompactDictionary.from_words([word.strip() for word in f])
+    dictionary.save(cache_file, source)
+    return dictionary
 
-dict_tuple.sort(key=lambda x: -x.score)  # スコアが大きい順にソートする
 
+# 辞書を先頭から順に見ていく方法 (元の実装)
+# 見つかった単語の順位を返す。
+def find_anagram_linear(vec: tuple, dictionary: CompactDictionary):
+    # filterとnextを使用して条件を満たす最初の単語を取得。
+    return next(
+        filter(
+            lambda rank: is_word_anagram(vec, dictionary.vector(rank)),
+            range(len(dictionary)),
+        ),
+        None,  # 条件を満たす単語がない場合は None を返す
+    )
+
+
+# find_anagram_linearと同じ答えを返す。入力にない文字を使う単語は、
+# 26文字の比較をする前にマスクのAND 1回で除く。
+# statsを渡すと、[マスクで除いた数, 26文字の比較をした数]を足していく。
+def find_anagram_masked(
+    vec: tuple, dictionary: CompactDictionary, masks: array, stats=None
+):
+    missing = ~letter_mask(vec)  # 入力に含まれない文字のビット
+    rejected = 0
+    for rank, mask in enumerate(masks):
+        if mask & missing:
+            rejected += 1
+            continue
+        if is_word_anagram(vec, dictionary.vector(rank)):
+            break
+    else:
+        rank = len(dictionary)
+    if stats is not None:
+        stats[0] += rejected
+        stats[1] += min(rank + 1, len(dictionary)) - rejected
+    return rank if rank < len(dictionary) else None
+
+
+# 入力ベクトルから作れる単語のうち、スコアが高い順にk個の順位を返す。
+# (スコアが同じときは辞書の順番。k=1ならfind_anagram_linearと同じ答え)
+# これまでに見つけたk個をヒープに入れておき、辞書はスコア順に並んでいるので、
+# 残りの単語のスコアがk番目のスコアを超えられなくなったら探索をやめる。
+def top_k_anagrams_linear(
+    vec: tuple, dictionary: CompactDictionary, k: int, masks: array = None
+) -> list:
+    if k <= 0:
+        return []
+    if masks is None:
+        masks = dictionary.masks
+    missing = ~letter_mask(vec)  # 入力に含まれない文字のビット
+    heap = []  # (スコア, -順位) の最小ヒープ。先頭がk番目に良い単語
+    for rank, mask in enumerate(masks):
+        if len(heap) == k and dictionary.scores[rank] <= heap[0][0]:
+            # スコアが同じでも、後ろの単語は順位で負けるので入れ替わらない
+            break
+        if mask & missing or not is_word_anagram(vec, dictionary.vector(rank)):
+            continue
+        if len(heap) < k:
+            heapq.heappush(heap, (dictionary.scores[rank], -rank))
+        else:
+            heapq.heapreplace(heap, (dictionary.scores[rank], -rank))
+    return sorted(-rank for _, rank in heap)
+
+
+class AnagramTrie:
+    """
+    辞書の単語ベクトルを、文字の出現回数で枝分かれさせた木にまとめたもの。
+
+    深さdの節点の子は「order[d]の文字を何回使うか」で分かれていて、
+    入力の出現回数より多い枝はまとめて枝刈りできる。
+    各節点には部分木の中で一番良い単語の順位(辞書の中の位置、
+    小さいほどスコアが高い)を持たせておき、今までに見つけた答えより
+    良い単語がない部分木は探索しない。
+    """
+
+    # 単語がこの数以下になったら、それ以上は枝分かれさせずに葉にする
+    LEAF_SIZE = 16
+
+    def __init__(self, dictionary: CompactDictionary):
+        """
+        :param dictionary: load_dictionaryで読み込んだ辞書
+        """
+        self.dictionary = dictionary
+
+        # 辞書の中で使われる回数が少ない文字から順に枝分かれさせる。
+        # (q, j, x, z などを含まない入力は、根の近くで大部分を枝刈りできる)
+        usage = [0] * 26
+        for mask in dictionary.masks:
+            for i in range(26):
+                if mask >> i & 1:
+                    usage[i] += 1
+        self.order = sorted(range(26), key=lambda i: usage[i])
+        self.masks = dictionary.masks
+        self.root = self._build(list(range(len(dictionary))), 0)
+
+    # 節点は (一番良い順位, 子のタプル, 葉の順位のタプル)。
+    # ranksは昇順なので、先頭がその部分木で一番良い順位になる。
+    # 子は良い順位の順に並べておく。探索のときに、ある子が今の答えに
+    # 勝てなければ、残りの子も勝てないと分かる。
+    def _build(self, ranks: list, depth: int) -> tuple:
+        if not ranks:
+            return (None, None, ())
+        if len(ranks) <= self.LEAF_SIZE or depth == 26:
+            return (ranks[0], None, tuple(ranks))
+        letter = self.order[depth]
+        counts = self.dictionary.counts
+        groups = {}  # 出現回数 -> 順位のリスト
+        for rank in ranks:
+            groups.setdefault(counts[26 * rank + letter], []).append(rank)
+        children = [
+            (count, self._build(group, depth + 1)) for count, group in groups.items()
+        ]
+        children.sort(key=lambda item: item[1][0])
+        return (ranks[0], tuple(children), None)
+
+    # 入力ベクトルから作れる、一番スコアが高い単語の順位を返す。なければNone
+    def best_anagram(self, vec: tuple):
+        if self.root[0] is None:
+            return None
+        counts = [vec[letter] for letter in self.order]
+        missing = ~letter_mask(vec)  # 入力に含まれない文字のビット
+        best = self._search(self.root, vec, counts, missing, 0, len(self.dictionary))
+        if best == len(self.dictionary):
+            return None
+        return best
+
+    # depthの文字まで決めた節点nodeから、bestより良い順位の単語を探す
+    def _search(
+        self, node: tuple, vec: tuple, counts: list, missing: int, depth: int, best: int
+    ) -> int:
+        children = node[1]
+        if children is None:  # 葉は順位の順に、1つずつ確かめる
+            for rank in node[2]:
+                if rank >= best:
+                    break
+                if self.masks[rank] & missing:
+                    continue  # 入力にない文字を使う
+                if is_word_anagram(vec, self.dictionary.vector(rank)):
+                    return rank
+            return best
+        limit = counts[depth]
+        for count, child in children:
+            if child[0] >= best:
+                break  # これ以降の子はどれも今の答えより良くならない
+            if count > limit:
+                continue
+            best = self._search(child, vec, counts, missing, depth + 1, best)
+        return best
+
+    # 入力ベクトルから作れる単語のうち、スコアが高い順にk個の順位を返す。
+    # best_anagramと同じ枝刈りを、「k番目に良い順位」を基準にして行う。
+    def top_k_anagrams(self, vec: tuple, k: int) -> list:
+        if self.root[0] is None or k <= 0:
+            return []
+        counts = [vec[letter] for letter in self.order]
+        missing = ~letter_mask(vec)
+        heap = []  # -順位 の最小ヒープ。先頭がk番目に良い(一番悪い)順位
+        self._search_top_k(self.root, vec, counts, missing, 0, k, heap)
+        return sorted(-rank for rank in heap)
+
+    def _search_top_k(
+        self,
+        node: tuple,
+        vec: tuple,
+        counts: list,
+        missing: int,
+        depth: int,
+        k: int,
+        heap: list,
+    ) -> None:
+        children = node[1]
+        if children is None:
+            for rank in node[2]:
+                if len(heap) == k and rank >= -heap[0]:
+                    break  # k個見つかっていて、k番目より悪い
+                if self.masks[rank] & missing:
+                    continue
+                if is_word_anagram(vec, self.dictionary.vector(rank)):
+                    if len(heap) < k:
+                        heapq.heappush(heap, -rank)
+                    else:
+                        heapq.heapreplace(heap, -rank)
+            return
+        limit = counts[depth]
+        for count, child in children:
+            if len(heap) == k and child[0] >= -heap[0]:
+                break  # これ以降の子はどれもk番目より良くならない
+            if count > limit:
+                continue
+            self._search_top_k(child, vec, counts, missing, depth + 1, k, heap)
+
+
+class VectorMatcher:
+    """
+    辞書の単語ベクトルをN×26のuint8の行列にまとめて、numpyで入力の単語を
+    まとめて(バッチで)判定する。
+
+    「すべての文字の出現回数が入力以下」のマスクを文字ごとに計算して、
+    辞書はスコア順に並んでいるので、マスクが最初にTrueになる単語が答えになる。
+    """
+
+    # 一度に判定する入力の数。マスクは BATCH_SIZE × N のboolになる
+    BATCH_SIZE = 128
+    # 最初に判定する辞書の単語の数
+    FIRST_BLOCK = 1024
+
+    def __init__(self, dictionary: CompactDictionary):
+        """
+        :param dictionary: load_dictionaryで読み込んだ辞書
+        """
+        if np is None:
+            raise ImportError("VectorMatcher requires numpy")
+        self.dictionary = dictionary
+        # 辞書のcountsがそのままN×26の行列になる (コピーしない)
+        self.matrix = np.frombuffer(dictionary.counts, dtype=np.uint8).reshape(
+            len(dictionary), 26
+        )
+        # 文字ごとの列を連続したメモリに置いておく (ブロードキャストが速くなる)
+        self.columns = [np.ascontiguousarray(self.matrix[:, i]) for i in range(26)]
+
+    # 入力ベクトルのリストに対して、それぞれ一番スコアが高い単語の順位
+    # (なければNone)を返す
+    def best_anagrams(self, vecs: list) -> list:
+        results = []
+        for start in range(0, len(vecs), self.BATCH_SIZE):
+            results.extend(self._match_batch(vecs[start : start + self.BATCH_SIZE]))
+        return results
+
+    def _match_batch(self, vecs: list) -> list:
+        results = [None] * len(vecs)
+        # 辞書の出現回数は255以下なので、入力の255を超える回数は255にしても
+        # 答えは変わらない (uint8にそのまま入れると溢れてしまう)
+        inputs = np.minimum(np.array(vecs, dtype=np.int64).reshape(len(vecs), 26), 255)
+        inputs = inputs.astype(np.uint8)
+        pending = np.arange(len(vecs))  # まだ答えが見つかっていない入力
+
+        # 答えはスコアの高い単語の中にあることが多いので、辞書の先頭から
+        # ブロックごとに判定して、答えが見つかった入力は次のブロックで除く。
+        # ブロックの大きさは倍々にしていく。
+        start = 0
+        block = self.FIRST_BLOCK
+        while start < len(self.dictionary) and len(pending) > 0:
+            end = min(start + block, len(self.dictionary))
+            rows = inputs[pending]
+            mask = np.ones((len(pending), end - start), dtype=bool)
+            for i in range(26):
+                # 入力の出現回数が0の文字は、その文字を使わない単語だけが残る
+                mask &= self.columns[i][None, start:end] <= rows[:, i, None]
+            first = mask.argmax(axis=1)  # 最初にTrueになる位置 = 一番スコアが高い単語
+            found = mask[np.arange(len(pending)), first]
+            for row, index in zip(pending[found].tolist(), first[found].tolist()):
+                results[row] = start + index
+            pending = pending[~found]
+            start = end
+            block *= 2
+        return results
+
+
+class AnagramMemo:
+    """
+    答えは入力の単語ベクトル(文字の出現回数)だけで決まるので、
+    ベクトルをキーにして答えを覚えておく。同じ文字の組み合わせの入力が
+    また来たら、辞書を探さずに覚えた答えを返す。
+
+    覚える数はmax_sizeまでで、いっぱいになったら一番長く使われていない
+    ものから捨てる(LRU)。Pythonのdictは入れた順番を保つので、使ったものを
+    入れ直せば、先頭が一番長く使われていないものになる。
+    """
+
+    def __init__(self, matcher, max_size: int = 100000):
+        """
+        :param matcher: make_matcherで作った、ベクトルのリストから答えを探す関数
+        :param max_size: 覚えておく答えの最大数
+        """
+        self.matcher = matcher
+        self.max_size = max_size
+        self.memo = {}  # ベクトル -> 答えの順位 (または None)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __call__(self, vecs: list) -> list:
+        results = [None] * len(vecs)
+        missing = {}  # 覚えていないベクトル -> 入力の中の位置のリスト
+        for i, vec in enumerate(vecs):
+            if vec in self.memo:
+                results[i] = self.memo[vec] = self.memo.pop(vec)  # 最後に入れ直す
+                self.hits += 1
+            elif vec in missing:
+                missing[vec].append(i)  # 同じバッチの中の重複は一度だけ探す
+                self.hits += 1
+            else:
+                missing[vec] = [i]
+                self.misses += 1
+
+        if missing:
+            missing_vecs = list(missing)
+            for vec, result in zip(missing_vecs, self.matcher(missing_vecs)):
+                for i in missing[vec]:
+                    results[i] = result
+                self._remember(vec, result)
+        return results
+
+    def _remember(self, vec: tuple, result) -> None:
+        if self.max_size <= 0:
+            return
+        if len(self.memo) >= self.max_size:
+            del self.memo[next(iter(self.memo))]  # 一番長く使われていないもの
+            self.evictions += 1
+        self.memo[vec] = result
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.memo),
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+# 入力ベクトルのリストを受け取って、それぞれ一番スコアが高い単語の順位
+# (なければNone)のリストを返す関数を作る。木や行列は最初に一度だけ作る。
+# method: "numpy" (VectorMatcher), "masked" (linearにletter_maskの絞り込みを
+#         足したもの), "trie" (AnagramTrie), "linear" (元の実装)
+# large.txtではnumpyが一番速く(約0.15s)、masked(約0.9s)、trie(約3.8s。
+# 毎回木を作り直す時間を含む)の順なので、numpyを標準にする。
+# memo_sizeが0より大きければ、AnagramMemoで答えを覚えておく。
+def make_matcher(
+    dictionary: CompactDictionary, method: str = "numpy", memo_size: int = 0
+):
+    if memo_size > 0:
+        return AnagramMemo(make_matcher(dictionary, method), memo_size)
+    if method == "numpy" and np is None:
+        method = "masked"  # numpyがなければ、次に速いmaskedで探す
+    if method == "numpy":
+        return VectorMatcher(dictionary).best_anagrams
+    if method == "trie":
+        trie = AnagramTrie(dictionary)
+        return lambda vecs: [trie.best_anagram(vec) for vec in vecs]
+    if method == "linear":
+        return lambda vecs: [find_anagram_linear(vec, dictionary) for vec in vecs]
+    if method == "masked":
+        return lambda vecs: [
+            find_anagram_masked(vec, dictionary, dictionary.masks) for vec in vecs
+        ]
+    raise ValueError("unknown method: %s" % method)
+
+
+def best_anagrams(
+    vecs: list, dictionary: CompactDictionary, method: str = "numpy"
+) -> list:
+    return make_matcher(dictionary, method)(vecs)
+
+
+# 並列実行のとき、各プロセスが使う辞書と探索の関数。
+# forkできる環境では、親プロセスで作ったものをそのまま引き継ぐので、
+# 辞書や木をタスクごとにpickleして送ることはない。
+_worker_dictionary = None
+_worker_matcher = None
+
+
+def _init_worker(dictionary: CompactDictionary, method: str, memo_size: int) -> None:
+    # forkできない環境(spawn)では、各プロセスの起動時に一度だけ作る
+    global _worker_dictionary, _worker_matcher
+    _worker_dictionary = dictionary
+    _worker_matcher = make_matcher(dictionary, method, memo_size)
+
+
+# chunkの答えと、このchunkで増えたAnagramMemoの(hits, misses, evictions)を返す
+# (memoを使わないときはNone)
+def _match_chunk(words: list) -> tuple:
+    memo = _worker_matcher if isinstance(_worker_matcher, AnagramMemo) else None
+    if memo is not None:
+        before = (memo.hits, memo.misses, memo.evictions)
+    results = _worker_matcher([to_vector(word) for word in words])
+    counts = None
+    if memo is not None:
+        counts = (
+            memo.hits - before[0],
+            memo.misses - before[1],
+            memo.evictions - before[2],
+        )
+    words = [
+        _worker_dictionary.word(rank) if rank is not None else None for rank in results
+    ]
+    return words, counts
+
+
+# 入力ファイルをchunk_size語ずつに分けて読む
+def read_chunks(input_file: str, chunk_size: int):
+    with open(input_file, "r") as f:
+        chunk = []
+        for word in f:
+            chunk.append(word.strip())
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+# 入力ファイルを分割して、processes個のプロセスで並列に探索する。
+# 答えは入力と同じ順番で返ってくる(見つからなかった単語はNone)。
+# memo_stats(辞書)を渡すと、各プロセスのAnagramMemoの"hits", "misses",
+# "evictions"を足していく。
+def parallel_find_anagrams(
+    input_file: str,
+    dictionary: CompactDictionary,
+    method: str = "numpy",
+    processes: int = None,
+    chunk_size: int = 1000,
+    memo_size: int = 0,
+    memo_stats: dict = None,
+):
+    global _worker_dictionary, _worker_matcher
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        # AnagramMemoは各プロセスが自分の分を持つ
+        _init_worker(dictionary, method, memo_size)
+        pool = context.Pool(processes)
+    else:
+        pool = multiprocessing.Pool(
+            processes, _init_worker, (dictionary, method, memo_size)
+        )
+    with pool:
+        # imapは渡した順番のまま結果を返すので、出力の順番が入力と揃う
+        chunks = read_chunks(input_file, chunk_size)
+        for words, counts in pool.imap(_match_chunk, chunks):
+            if memo_stats is not None and counts is not None:
+                for name, count in zip(("hits", "misses", "evictions"), counts):
+                    memo_stats[name] = memo_stats.get(name, 0) + count
+            yield from words
+    _worker_dictionary = _worker_matcher = None
+
+
+# matcherで入力ファイルの単語の答えを探して、見つかった単語のリストを返す
+def match_file(input_file: str, dictionary: CompactDictionary, matcher) -> list:
+    with open(input_file, "r") as f:
+        vecs = [to_vector(word.strip()) for word in f]
 
-input_file = sys.argv[1]
-with open(input_file, "r") as f:
     anagram_word_list = []  # ここにanagramを保存していく
-    for word in f:
-        word = word.strip()
-        vec = to_vector(word)
-        # filterとnextを使用して条件を満たす最初の単語を取得。
-        matching_word = next(
-            filter(lambda word_dict: is_word_anagram(vec, word_dict), dict_tuple),
-            None,  # 条件を満たす単語がない場合は None を返す
+    for rank in matcher(vecs):
+        if rank is not None:  # 順位0も答えなので、Noneかどうかで判定する
+            anagram_word_list.append(dictionary.word(rank))
+    return anagram_word_list
+
+
+# 入力ベクトルのリストに対して、それぞれスコアが高い順にk個の単語の順位を返す。
+# method: "trie"と"numpy"はAnagramTrie (numpyのk個版はなく、k個を探すのは
+#         木の方がlinearより速い)、それ以外は top_k_anagrams_linear
+def top_k_anagrams(
+    vecs: list, dictionary: CompactDictionary, k: int, method: str = "trie"
+) -> list:
+    if method in ("trie", "numpy"):
+        trie = AnagramTrie(dictionary)
+        return [trie.top_k_anagrams(vec, k) for vec in vecs]
+    return [top_k_anagrams_linear(vec, dictionary, k) for vec in vecs]
+
+
+def find_anagrams(
+    input_file: str,
+    dictionary: CompactDictionary,
+    method: str = "numpy",
+    processes: int = 1,
+    memo_size: int = 0,
+    memo_stats: dict = None,
+) -> list:
+    if processes != 1:
+        words = parallel_find_anagrams(
+            input_file,
+            dictionary,
+            method,
+            processes,
+            memo_size=memo_size,
+            memo_stats=memo_stats,
         )
+        return [word for word in words if word]
+    matcher = make_matcher(dictionary, method, memo_size)
+    words = match_file(input_file, dictionary, matcher)
+    if memo_stats is not None and isinstance(matcher, AnagramMemo):
+        for name in ("hits", "misses", "evictions"):
+            memo_stats[name] = memo_stats.get(name, 0) + getattr(matcher, name)
+    return words
 
-        if matching_word:
-            anagram_word_list.append(matching_word.word)
 
+# python hw2.py (input_file).txt (output_file).txt [--linear | --masked | --trie]
+#               [--processes=N] [--memo=N] [--top=K]
+# 何もつけなければ、numpyでまとめて判定する (numpyがなければ--maskedと同じ)
+# --linear をつけると、辞書を先頭から探す (元の実装)
+# --masked をつけると、--linearにletter_maskでの絞り込みを足して探す
+# --trie をつけると、AnagramTrieで探す
+# --processes=N をつけると、N個のプロセスで並列に探索する (0ならCPUの数)
+# --memo=N をつけると、N個まで答えを覚えておき、ヒット率を表示する
+#           (並列のときは、各プロセスのヒット・ミスの数を足して表示する)
+# --top=K をつけると、1行に1つの入力について、スコアが高い順にK個の単語を
+#         スペース区切りで書き出す (score_checkerでは確かめられない)
+if __name__ == "__main__":
+    # 引数の確認
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if len(args) < 2:
+        print(
+            "Usage: python hw2.py (input_file).txt (output_file).txt"
+            " [--linear | --masked | --trie] [--processes=N] [--memo=N]"
+            " [--top=K]"
+        )
+        sys.exit(1)
+
+    method = "numpy"
+    if "--linear" in sys.argv:
+        method = "linear"
+    elif "--masked" in sys.argv:
+        method = "masked"
+    elif "--trie" in sys.argv:
+        method = "trie"
+    processes = 1
+    memo_size = 0
+    top_k = 0
+    for arg in sys.argv:
+        if arg.startswith("--processes="):
+            processes = int(arg.split("=", 1)[1]) or None
+        elif arg.startswith("--memo="):
+            memo_size = int(arg.split("=", 1)[1])
+        elif arg.startswith("--top="):
+            top_k = int(arg.split("=", 1)[1])
 
-output_file = sys.argv[2]
-with open(output_file, "w") as o:
-    for row in anagram_word_list:  # anagram_word_listにある単語を書き込む
-        o.write(row + "\n")
+    # 実行時間を、辞書の読み込み・探索・書き込みに分けて計測する (秒)
+    start = time.perf_counter()
+    dictionary = load_dictionary()
+    loaded = time.perf_counter()
+    if top_k > 0:
+        with open(args[0], "r") as f:
+            vecs = [to_vector(word.strip()) for word in f]
+        anagram_word_list = [
+            " ".join(dictionary.word(rank) for rank in ranks)
+            for ranks in top_k_anagrams(vecs, dictionary, top_k, method)
+        ]
+    else:
+        # 並列のときは、各プロセスのAnagramMemoの数を足したもの
+        memo_stats = {"hits": 0, "misses": 0, "evictions": 0}
+        anagram_word_list = find_anagrams(
+            args[0], dictionary, method, processes, memo_size, memo_stats
+        )
+        if memo_size > 0:
+            total = memo_stats["hits"] + memo_stats["misses"]
+            memo_stats["hit_ratio"] = memo_stats["hits"] / total if total else 0.0
+            print(
+                "Memo: hits {hits}, misses {misses}, evictions {evictions}, "
+                "hit ratio {hit_ratio:.1%}".format(**memo_stats)
+            )
 
+    searched = time.perf_counter()
 
-# 実行時間を計測  large.txtで0.02
-end = time.perf_counter()
-print("Runtimes: {:.2f}".format((end - start) / 60))
+    output_file = args[1]
+    with open(output_file, "w") as o:
+        for row in anagram_word_list:  # anagram_word_listにある単語を書き込む
+            o.write(row + "\n")
+
+    end = time.perf_counter()
+    print(
+        "Runtimes: load {:.3f}s, search {:.3f}s, write {:.3f}s, total {:.3f}s".format(
+            loaded - start, searched - loaded, end - searched, end - start
+        )
+    )
@@ -0,0 +1,172 @@
+# python phrase_anagram.py "dormitory" [--limit=N] [--time=S] [--max-words=N]
+#                          [--min-length=N]
+#
+# 問題
+# 与えられた文字列の文字をちょうど全部使う、words.txtの単語を並べたフレーズ
+# (複数の単語のアナグラム)を列挙する。
+#
+# hw2と同じ文字の出現回数ベクトルを使って、残りの文字のベクトルを減らしながら
+# 深さ優先探索する。
+# - 同じ文字の組み合わせの単語(listen, silent ...)はまとめて1つの候補にし、
+#   最後に展開する
+# - 候補は長い単語から順に試し、同じフレーズを並び替えたものは探さない
+#   (候補の番号が減らない順にだけ選ぶ)
+# - 残りの文字を使い切れないと分かった(残りのベクトル, 候補の番号)は覚えておき、
+#   二度と探さない
+# - 見つけるフレーズの数(limit)と時間(time_budget)に上限をつけられる
+
+import itertools
+import sys
+import time
+
+import hw2
+
+
+class PhraseAnagramSearch:
+    def __init__(self, dictionary: hw2.CompactDictionary, min_word_length: int = 2):
+        """
+        :param dictionary: hw2.load_dictionaryで読み込んだ辞書
+        :param min_word_length: フレーズに使う単語の最小の長さ
+            (words.txtにはa〜zの1文字の単語がすべて入っているので、
+            1にすると答えがとても多くなる)
+        """
+        self.dictionary = dictionary
+        # 単語ベクトル -> その文字でできる単語のリスト
+        self.groups = {}
+        for rank in range(len(dictionary)):
+            word = dictionary.word(rank)
+            if len(word) >= min_word_length:
+                self.groups.setdefault(dictionary.vector(rank), []).append(word)
+        self.vectors = list(self.groups)
+        self.masks = [hw2.letter_mask(vec) for vec in self.vectors]
+
+    def search(
+        self,
+        phrase: str,
+        limit: int = 100,
+        time_budget: float = None,
+        max_words: int = None,
+    ) -> tuple:
+        """
+        phraseの文字をちょうど使い切るフレーズを探す。
+        :param phrase: 入力の文字列 (a〜z以外の文字は無視する)
+        :param limit: 見つけるフレーズの最大数
+        :param time_budget: 探索にかける最大の秒数 (Noneなら制限なし)
+        :param max_words: フレーズの単語の最大数 (Noneなら制限なし)
+        :return: (フレーズのリスト, limitかtime_budgetで途中で打ち切ったかどうか)
+        """
+        letters = "".join(c for c in phrase.lower() if "a" <= c <= "z")
+        target = hw2.to_vector(letters)
+        if not letters or limit <= 0:
+            return [], False
+
+        # 入力の文字から作れる単語だけを候補にして、長い順に並べる
+        target_missing = ~hw2.letter_mask(target)
+        candidates = [
+            i
+            for i, vec in enumerate(self.vectors)
+            if not self.masks[i] & target_missing and hw2.is_word_anagram(target, vec)
+        ]
+        candidates.sort(key=lambda i: -sum(self.vectors[i]))
+
+        self._limit = limit
+        self._deadline = (
+            time.perf_counter() + time_budget if time_budget is not None else None
+        )
+        self._max_words = max_words
+        # 使い切れないと分かった (残りのベクトル, 候補の先頭, 残りの単語数)
+        self._dead = set()
+        self._truncated = False
+        self._phrases = []
+        self._search(target, candidates, [])
+
+        return self._phrases, self._truncated
+
+    # remainingの文字を、candidatesの中の単語で使い切る組み合わせを探す。
+    # chosenはここまでに選んだ候補。見つかったら_phrasesに追加する。
+    # 何か見つかったか、途中で打ち切ったらTrueを返す。
+    def _search(self, remaining: tuple, candidates: list, chosen: list) -> bool:
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            self._truncated = True
+            return True
+        words_left = None
+        if self._max_words is not None:
+            words_left = self._max_words - len(chosen) - 1
+            if words_left < 0:
+                return False
+
+        found = False
+        for j, candidate in enumerate(candidates):
+            vec = self.vectors[candidate]
+            rest = tuple(r - v for r, v in zip(remaining, vec))
+            key = (rest, candidate, words_left)
+            chosen.append(candidate)
+            if not any(rest):
+                self._add_phrases(chosen)
+                found = True
+            elif key not in self._dead:
+                # 残りの文字に収まる候補だけを次に渡す (自分自身より前は選ばない)
+                missing = ~hw2.letter_mask(rest)
+                next_candidates = [
+                    c
+                    for c in candidates[j:]
+                    if not self.masks[c] & missing
+                    and hw2.is_word_anagram(rest, self.vectors[c])
+                ]
+                # 残りの文字のどれかを含む候補がひとつもなければ、使い切れない
+                covered = 0
+                for c in next_candidates:
+                    covered |= self.masks[c]
+                if covered == hw2.letter_mask(rest) and self._search(
+                    rest, next_candidates, chosen
+                ):
+                    found = True
+                elif not self._truncated:
+                    self._dead.add(key)
+            chosen.pop()
+
+            if self._truncated:
+                return True
+        return found
+
+    # 選んだ候補(文字の組み合わせ)を、実際の単語のフレーズに展開する
+    def _add_phrases(self, chosen: list) -> None:
+        groups = [self.groups[self.vectors[candidate]] for candidate in chosen]
+        for words in itertools.product(*groups):
+            if len(self._phrases) >= self._limit:
+                self._truncated = True  # これ以上は探さない
+                return
+            self._phrases.append(" ".join(words))
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if len(args) != 1:
+        print(
+            'Usage: python phrase_anagram.py "phrase" [--limit=N] [--time=S]'
+            " [--max-words=N] [--min-length=N]"
+        )
+        sys.exit(1)
+
+    options = {"limit": "100", "time": None, "max-words": None, "min-length": "2"}
+    for arg in sys.argv[1:]:
+        if arg.startswith("--") and "=" in arg:
+            name, value = arg[2:].split("=", 1)
+            options[name] = value
+
+    start = time.perf_counter()
+    search = PhraseAnagramSearch(hw2.load_dictionary(), int(options["min-length"]))
+    phrases, truncated = search.search(
+        args[0],
+        limit=int(options["limit"]),
+        time_budget=float(options["time"]) if options["time"] else None,
+        max_words=int(options["max-words"]) if options["max-words"] else None,
+    )
+    for phrase in phrases:
+        print(phrase)
+    end = time.perf_counter()
+    print(
+        "%d phrases%s in %.2fs"
+        % (len(phrases), " (stopped early)" if truncated else "", end - start),
+        file=sys.stderr,
+    )
@@ -1,10 +1,15 @@
 #! /usr/bin/python3
 
+import multiprocessing
 import sys
 
 # How to use:
 #
-# $ python3 score_checker.py your_answer_file
+# $ python3 score_checker.py data_file your_answer_file [--processes=N]
+#
+# The files are read line by line, so they can be much larger than memory.
+# Every error is reported. --processes=N checks chunks of lines in N
+# processes (0 means one per CPU).
 #
 
 # SCORES of the characters:
@@ -42,28 +47,108 @@ def is_anagram(anagram, data):
         data_table[ord(character) - ord('a')] -= 1
     return True
 
-def main(data_file, answer_file):
-    valid_words = read_words(WORDS_FILE)
-    data_words = read_words(data_file)
-    answer_words = read_words(answer_file)
-    if len(data_words) != len(answer_words):
-        print("The number of words in %s and %s doesn't match." %
-              (data_file, answer_file))
-        exit(1)
+# Check one (line number, data word, answer word) pair.
+# Returns (error message or None, score of the answer).
+def check_pair(line_number, data_word, answer_word, valid_words):
+    if not is_anagram(answer_word, data_word):
+        return ("line %d: '%s' is not an anagram of '%s'." %
+                (line_number, answer_word, data_word), 0)
+    if answer_word not in valid_words:
+        return ("line %d: '%s' is not a valid word!" %
+                (line_number, answer_word), 0)
+    return (None, calculate_score(answer_word))
+
+# Read the data and answer files line by line together, in chunks of
+# (line number, data word, answer word). If one file ends early, the
+# missing word is None and reading stops at that line.
+def read_pairs(data_file, answer_file, chunk_size=10000):
+    with open(data_file) as data, open(answer_file) as answer:
+        chunk = []
+        line_number = 0
+        while True:
+            data_line = data.readline()
+            answer_line = answer.readline()
+            if not data_line and not answer_line:
+                break
+            line_number += 1
+            chunk.append((line_number,
+                          data_line.rstrip('\n') if data_line else None,
+                          answer_line.rstrip('\n') if answer_line else None))
+            if not data_line or not answer_line:
+                break
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+# The set of valid words used by check_chunk. Each worker process loads it
+# once when it starts.
+_valid_words = None
+
+def _init_worker(words_file):
+    global _valid_words
+    _valid_words = set(read_words(words_file))
+
+# Returns (list of error messages, total score) for a chunk.
+def check_chunk(chunk):
+    errors = []
     score = 0
-    for i in range(len(data_words)):
-        if not is_anagram(answer_words[i], data_words[i]):
-            print("'%s' is not an anagram of '%s'." %
-                  (answer_words[i], data_words[i]))
-            exit(1)
-        if answer_words[i] not in valid_words:
-            print("'%s' is not a valid word!" % answer_words[i])
-            exit(1)
-        score += calculate_score(answer_words[i])
+    for line_number, data_word, answer_word in chunk:
+        if data_word is None or answer_word is None:
+            errors.append("line %d: the number of words in the data file and "
+                          "the answer file doesn't match." % line_number)
+            continue
+        error, word_score = check_pair(line_number, data_word, answer_word,
+                                       _valid_words)
+        if error:
+            errors.append(error)
+        score += word_score
+    return (errors, score)
+
+# Check every line and print every error. Returns (number of errors, score).
+# With processes > 1, the chunks are checked in a process pool; the errors
+# are still printed in line order.
+def validate(data_file, answer_file, processes=1, words_file=WORDS_FILE):
+    global _valid_words
+    pairs = read_pairs(data_file, answer_file)
+    pool = None
+    if processes == 1:
+        _init_worker(words_file)
+        results = map(check_chunk, pairs)
+    else:
+        pool = multiprocessing.Pool(processes, _init_worker, (words_file,))
+        results = pool.imap(check_chunk, pairs)
+
+    error_count = 0
+    score = 0
+    try:
+        for errors, chunk_score in results:
+            for error in errors:
+                print(error)
+            error_count += len(errors)
+            score += chunk_score
+    finally:
+        if pool:
+            pool.terminate()
+        _valid_words = None
+    return (error_count, score)
+
+def main(data_file, answer_file, processes=1):
+    error_count, score = validate(data_file, answer_file, processes)
+    if error_count:
+        print('Found %d error(s).' % error_count)
+        exit(1)
     print('You answer is correct! Your score is %d.' % score)
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("usage: %s data_file your_answer_file" % sys.argv[0])
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    processes = 1
+    for arg in sys.argv[1:]:
+        if arg.startswith('--processes='):
+            processes = int(arg.split('=', 1)[1]) or None
+    if len(args) != 2:
+        print("usage: %s data_file your_answer_file [--processes=N]" %
+              sys.argv[0])
         exit(1)
-    main(sys.argv[1], sys.argv[2])
+    main(args[0], args[1], processes)
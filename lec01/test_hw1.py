@@ -0,0 +1,73 @@
+# python -m unittest test_hw1.py
+
+import io
+import os
+import tempfile
+import unittest
+
+import hw1
+
+WORDS = ["listen", "silent", "enlist", "google", "cat", "act", "dog"]
+
+
+class TestLoadIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.words_file = os.path.join(self.tmp.name, "words.txt")
+        self.index_file = os.path.join(self.tmp.name, "words_index.pickle")
+        with open(self.words_file, "w") as f:
+            f.write("\n".join(WORDS) + "\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        index = hw1.load_index(self.words_file, self.index_file)
+        self.assertTrue(os.path.exists(self.index_file))
+        self.assertEqual(index, hw1.build_index(self.words_file))
+        self.assertEqual(index["eilnst"], ["enlist", "listen", "silent"])
+        # 2回目はファイルから読み込む (同じ中身になる)
+        self.assertEqual(hw1.load_index(self.words_file, self.index_file), index)
+
+    def test_rebuild_when_words_change(self):
+        hw1.load_index(self.words_file, self.index_file)
+        with open(self.words_file, "a") as f:
+            f.write("god\n")
+        index = hw1.load_index(self.words_file, self.index_file)
+        self.assertEqual(index["dgo"], ["dog", "god"])
+
+    def test_broken_index_file(self):
+        with open(self.index_file, "wb") as f:
+            f.write(b"not a pickle")
+        index = hw1.load_index(self.words_file, self.index_file)
+        self.assertEqual(index["act"], ["act", "cat"])
+
+
+class TestRunBatch(unittest.TestCase):
+    def test_anagrams_and_percentiles(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            words_file = os.path.join(tmp, "words.txt")
+            with open(words_file, "w") as f:
+                f.write("\n".join(WORDS) + "\n")
+            index = hw1.load_index(words_file, os.path.join(tmp, "index.pickle"))
+
+        output = io.StringIO()
+        stats = hw1.run_batch(index, io.StringIO("tinsel\n\ntac\nxyz\n"), output)
+        self.assertEqual(
+            output.getvalue().splitlines(),
+            ["tinsel enlist listen silent", "tac act cat", "xyz"],
+        )
+        self.assertEqual(stats["words"], 3)  # 空行は数えない
+        for name in ["seconds", "words_per_sec", "p50_us", "p99_us"]:
+            self.assertGreaterEqual(stats[name], 0.0)
+        self.assertLessEqual(stats["p50_us"], stats["p99_us"])
+
+    def test_percentile(self):
+        samples = list(range(100))
+        self.assertEqual(hw1.percentile(samples, 50), 50)
+        self.assertEqual(hw1.percentile(samples, 99), 99)
+        self.assertEqual(hw1.percentile([], 50), 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
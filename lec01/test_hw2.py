@@ -0,0 +1,250 @@
+# python -m unittest test_hw2.py
+
+import os
+import random
+import tempfile
+import unittest
+
+import hw2
+
+WORDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "words.txt")
+
+
+# テストを速くするため、辞書の一部だけを使う
+def small_dictionary(step: int = 10) -> hw2.CompactDictionary:
+    with open(WORDS_FILE) as f:
+        words = [line.strip() for line in f][::step]
+    return hw2.CompactDictionary.from_words(words)
+
+
+def random_words(count: int, min_length: int, max_length: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return [
+        "".join(rng.choice(letters) for _ in range(rng.randint(min_length, max_length)))
+        for _ in range(count)
+    ]
+
+
+# 辞書の単語を何個かおきに取り出す
+def sample_words(dictionary: hw2.CompactDictionary, step: int = 97) -> list:
+    return [dictionary.word(rank) for rank in range(0, len(dictionary), step)]
+
+
+class TestCompactDictionary(unittest.TestCase):
+    def test_from_words(self):
+        dictionary = hw2.CompactDictionary.from_words(["cat", "a", "quiz", "act"])
+        # スコアが大きい順。同じスコアなら元の順番
+        words = [dictionary.word(rank) for rank in range(len(dictionary))]
+        self.assertEqual(words, ["quiz", "cat", "act", "a"])
+        self.assertEqual(dictionary.score(0), 11)
+        self.assertEqual(tuple(dictionary.vector(1)), hw2.to_vector("cat"))
+        self.assertEqual(dictionary.masks[3], 1)
+
+    def test_save_and_load(self):
+        dictionary = small_dictionary()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "words.dict")
+            dictionary.save(path, (1, 2))
+            source, loaded = hw2.CompactDictionary.load(path)
+        self.assertEqual(source, (1, 2))
+        for name in ["counts", "scores", "masks", "offsets", "words_buffer"]:
+            self.assertEqual(getattr(loaded, name), getattr(dictionary, name))
+
+    def test_load_dictionary_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            words_file = os.path.join(tmp, "words.txt")
+            with open(words_file, "w") as f:
+                f.write("cat\ndog\n")
+            first = hw2.load_dictionary(words_file)
+            self.assertTrue(os.path.exists(os.path.join(tmp, "words.dict")))
+            self.assertEqual(hw2.load_dictionary(words_file).counts, first.counts)
+
+            # 単語ファイルが変わったら作り直す
+            with open(words_file, "w") as f:
+                f.write("cat\ndog\nzebra\n")
+            self.assertEqual(hw2.load_dictionary(words_file).word(0), "zebra")
+
+
+class TestAnagramTrie(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.dictionary = small_dictionary()
+        cls.trie = hw2.AnagramTrie(cls.dictionary)
+
+    def assert_same_as_linear(self, words: list):
+        for word in words:
+            vec = hw2.to_vector(word)
+            self.assertEqual(
+                self.trie.best_anagram(vec),
+                hw2.find_anagram_linear(vec, self.dictionary),
+                word,
+            )
+
+    def test_short_words(self):
+        # 答えのスコアが低い・答えがない場合
+        self.assert_same_as_linear(random_words(200, 1, 6))
+
+    def test_long_words(self):
+        self.assert_same_as_linear(random_words(200, 10, 36, seed=1))
+
+    def test_dictionary_words(self):
+        # 辞書の単語そのものを入力にすると、同じスコアの単語の並び順も確かめられる
+        self.assert_same_as_linear(sample_words(self.dictionary))
+
+    def test_empty(self):
+        empty = hw2.CompactDictionary.from_words([])
+        self.assertIsNone(hw2.AnagramTrie(empty).best_anagram(hw2.to_vector("abc")))
+        self.assertIsNone(self.trie.best_anagram(hw2.to_vector("")))
+
+
+class TestLetterMask(unittest.TestCase):
+    def test_letter_mask(self):
+        self.assertEqual(hw2.letter_mask(hw2.to_vector("")), 0)
+        self.assertEqual(hw2.letter_mask(hw2.to_vector("abba")), 0b11)
+        self.assertEqual(hw2.letter_mask(hw2.to_vector("z")), 1 << 25)
+
+    def test_same_as_linear(self):
+        dictionary = small_dictionary()
+        masks = dictionary.masks
+        stats = [0, 0]
+        for word in random_words(100, 1, 36, seed=4):
+            vec = hw2.to_vector(word)
+            self.assertEqual(
+                hw2.find_anagram_masked(vec, dictionary, masks, stats),
+                hw2.find_anagram_linear(vec, dictionary),
+            )
+        self.assertGreater(stats[0], stats[1])  # ほとんどはマスクだけで除ける
+
+
+class TestTopK(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.dictionary = small_dictionary()
+        cls.trie = hw2.AnagramTrie(cls.dictionary)
+
+    # 辞書全体を調べて、作れる単語の順位を良い順に返す
+    def all_anagrams(self, vec: tuple) -> list:
+        return [
+            rank
+            for rank in range(len(self.dictionary))
+            if hw2.is_word_anagram(vec, self.dictionary.vector(rank))
+        ]
+
+    def test_same_as_brute_force(self):
+        for word in random_words(100, 1, 36, seed=5):
+            vec = hw2.to_vector(word)
+            expected = self.all_anagrams(vec)
+            for k in [1, 3, 10]:
+                self.assertEqual(self.trie.top_k_anagrams(vec, k), expected[:k])
+                self.assertEqual(
+                    hw2.top_k_anagrams_linear(vec, self.dictionary, k), expected[:k]
+                )
+
+    def test_k_is_zero(self):
+        vec = hw2.to_vector("listen")
+        self.assertEqual(self.trie.top_k_anagrams(vec, 0), [])
+        self.assertEqual(hw2.top_k_anagrams_linear(vec, self.dictionary, 0), [])
+
+
+@unittest.skipIf(hw2.np is None, "numpy is not installed")
+class TestVectorMatcher(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.dictionary = small_dictionary()
+        cls.matcher = hw2.VectorMatcher(cls.dictionary)
+
+    def test_same_as_linear(self):
+        words = random_words(300, 1, 36, seed=2)
+        words += sample_words(self.dictionary)
+        vecs = [hw2.to_vector(word) for word in words]
+        results = self.matcher.best_anagrams(vecs)
+        for vec, result in zip(vecs, results):
+            self.assertEqual(result, hw2.find_anagram_linear(vec, self.dictionary))
+
+    def test_many_copies_of_a_letter(self):
+        words = ["a" * 300 + "bcde", "e" * 256 + "tsrh", "z" * 1000]
+        vecs = [hw2.to_vector(word) for word in words]
+        results = self.matcher.best_anagrams(vecs)
+        for vec, result in zip(vecs, results):
+            self.assertEqual(result, hw2.find_anagram_linear(vec, self.dictionary))
+
+    def test_empty(self):
+        self.assertEqual(self.matcher.best_anagrams([]), [])
+        self.assertEqual(
+            hw2.VectorMatcher(hw2.CompactDictionary.from_words([])).best_anagrams(
+                [hw2.to_vector("abc")]
+            ),
+            [None],
+        )
+
+
+class TestAnagramMemo(unittest.TestCase):
+    def test_hits_and_eviction(self):
+        dictionary = small_dictionary()
+        calls = []
+
+        def matcher(vecs):
+            calls.append(len(vecs))
+            return [hw2.find_anagram_linear(vec, dictionary) for vec in vecs]
+
+        memo = hw2.AnagramMemo(matcher, max_size=2)
+        vecs = [hw2.to_vector(word) for word in ["listen", "silent", "cat"]]
+        expected = matcher(vecs)
+        calls.clear()
+
+        # "listen" と "silent" は同じベクトルなので、一度しか探さない
+        self.assertEqual(memo(vecs), expected)
+        self.assertEqual(calls, [2])
+        self.assertEqual(memo(vecs[:1]), expected[:1])
+        self.assertEqual(calls, [2])
+
+        # 覚えられるのは2つまでなので、一番長く使われていない "cat" が捨てられる
+        memo([hw2.to_vector("dog")])
+        self.assertEqual(memo([hw2.to_vector("cat")]), expected[2:])
+        self.assertEqual(calls, [2, 1, 1])
+        stats = memo.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 4))
+        self.assertEqual((stats["evictions"], stats["size"]), (2, 2))
+
+
+class TestParallel(unittest.TestCase):
+    def test_same_as_sequential(self):
+        dictionary = small_dictionary()
+        words = random_words(500, 1, 20, seed=3)
+        with tempfile.TemporaryDirectory() as tmp:
+            input_file = os.path.join(tmp, "input.txt")
+            with open(input_file, "w") as f:
+                f.write("\n".join(words) + "\n")
+            expected = hw2.find_anagrams(input_file, dictionary)
+            results = list(
+                hw2.parallel_find_anagrams(
+                    input_file, dictionary, processes=2, chunk_size=37
+                )
+            )
+        self.assertEqual(len(results), len(words))  # 入力と同じ順番・同じ数
+        self.assertEqual([word for word in results if word], expected)
+
+    def test_memo_stats(self):
+        dictionary = small_dictionary()
+        words = random_words(50, 1, 20, seed=5) * 4
+        with tempfile.TemporaryDirectory() as tmp:
+            input_file = os.path.join(tmp, "input.txt")
+            with open(input_file, "w") as f:
+                f.write("\n".join(words) + "\n")
+            memo_stats = {}
+            results = hw2.find_anagrams(
+                input_file,
+                dictionary,
+                processes=2,
+                memo_size=100,
+                memo_stats=memo_stats,
+            )
+            self.assertEqual(results, hw2.find_anagrams(input_file, dictionary))
+        # 各プロセスのヒットとミスを足すと、入力の数になる
+        self.assertEqual(memo_stats["hits"] + memo_stats["misses"], len(words))
+        self.assertGreater(memo_stats["hits"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
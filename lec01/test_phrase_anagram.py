@@ -0,0 +1,54 @@
+# python -m unittest test_phrase_anagram.py
+
+import unittest
+
+import hw2
+from phrase_anagram import PhraseAnagramSearch
+
+WORDS = ["dirty", "room", "moor", "dormitory", "dirt", "roomy", "or", "a", "i"]
+
+
+class TestPhraseAnagramSearch(unittest.TestCase):
+    def setUp(self):
+        self.search = PhraseAnagramSearch(hw2.CompactDictionary.from_words(WORDS))
+
+    def test_all_phrases(self):
+        phrases, truncated = self.search.search("Dirty room!")
+        self.assertFalse(truncated)
+        self.assertEqual(
+            sorted(phrases),
+            ["dirty moor", "dirty room", "dormitory", "roomy dirt"],
+        )
+
+    def test_each_phrase_uses_every_letter(self):
+        phrases, _ = self.search.search("dormitory")
+        for phrase in phrases:
+            self.assertEqual(
+                hw2.to_vector(phrase.replace(" ", "")), hw2.to_vector("dormitory")
+            )
+
+    def test_limit(self):
+        phrases, truncated = self.search.search("dormitory", limit=2)
+        self.assertEqual(len(phrases), 2)
+        self.assertTrue(truncated)
+
+    def test_max_words(self):
+        phrases, _ = self.search.search("dormitory", max_words=1)
+        self.assertEqual(phrases, ["dormitory"])
+
+    def test_min_word_length(self):
+        search = PhraseAnagramSearch(
+            hw2.CompactDictionary.from_words(WORDS), min_word_length=1
+        )
+        phrases, _ = search.search("ai")
+        self.assertEqual(phrases, ["a i"])
+        self.assertEqual(self.search.search("ai"), ([], False))
+
+    def test_time_budget(self):
+        phrases, truncated = self.search.search("dormitory", time_budget=0)
+        self.assertEqual(phrases, [])
+        self.assertTrue(truncated)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+# python -m unittest test_score_checker.py
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+import score_checker
+
+WORDS = ["cat", "act", "dog", "god", "zoo"]
+
+
+class TestScoreChecker(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.words_file = self.write("words.txt", WORDS)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name: str, lines: list) -> str:
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "w") as f:
+            f.write("".join(line + "\n" for line in lines))
+        return path
+
+    # validateを実行して、(エラーの数, スコア, 表示された行のリスト)を返す
+    def validate(self, data: list, answer: list, processes: int = 1) -> tuple:
+        data_file = self.write("data.txt", data)
+        answer_file = self.write("answer.txt", answer)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            error_count, score = score_checker.validate(
+                data_file, answer_file, processes, self.words_file
+            )
+        return error_count, score, output.getvalue().splitlines()
+
+    def test_read_pairs(self):
+        data_file = self.write("data.txt", ["tac", "odg", "ozo"])
+        answer_file = self.write("answer.txt", ["cat", "dog"])
+        chunks = list(score_checker.read_pairs(data_file, answer_file, chunk_size=2))
+        self.assertEqual(
+            chunks,
+            [[(1, "tac", "cat"), (2, "odg", "dog")], [(3, "ozo", None)]],
+        )
+
+    def test_valid(self):
+        error_count, score, lines = self.validate(
+            ["tac", "odgx", "oozq"], ["cat", "dog", "zoo"]
+        )
+        self.assertEqual((error_count, lines), (0, []))
+        self.assertEqual(score, sum(map(score_checker.calculate_score, WORDS[::2])))
+
+    def test_wrong_answer(self):
+        error_count, score, lines = self.validate(
+            ["tac", "odg", "ozo"], ["dog", "gdo", "zoo"]
+        )
+        self.assertEqual(error_count, 2)
+        self.assertEqual(
+            lines,
+            [
+                "line 1: 'dog' is not an anagram of 'tac'.",
+                "line 2: 'gdo' is not a valid word!",
+            ],
+        )
+        self.assertEqual(score, score_checker.calculate_score("zoo"))
+
+    def test_missing_word(self):
+        error_count, _, lines = self.validate(["tac", "odg"], ["cat"])
+        self.assertEqual(error_count, 1)
+        self.assertEqual(
+            lines,
+            [
+                "line 2: the number of words in the data file and the answer "
+                "file doesn't match."
+            ],
+        )
+
+    def test_processes(self):
+        data = ["tac", "odg", "ozo"] * 5000
+        answer = ["cat", "dog", "zoo"] * 5000
+        answer[14000] = "god"  # 2つ目のchunkの中のエラー
+        expected = self.validate(data, answer)
+        self.assertEqual(expected[0], 1)
+        self.assertEqual(expected[2], ["line 14001: 'god' is not an anagram of 'ozo'."])
+        self.assertEqual(self.validate(data, answer, processes=2), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
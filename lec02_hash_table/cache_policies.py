@@ -0,0 +1,539 @@
+from __future__ import annotations
+from typing import Optional
+import random, sys
+
+from hw4_cache import Cache, Page
+
+# hw4_cache.Cache(LRU)以外の、キャッシュから捨てるページの選び方(eviction policy)。
+# どれもCacheと同じように使える。
+#   access_page(url, contents) -> bool  ヒットしたらTrue
+#   get_pages() -> list                  キャッシュにあるURL
+# access_pageはどれもO(1)。
+#
+# - LFUCache: アクセス回数が一番少ないページを捨てる
+# - TwoQueueCache (2Q): 1回しかアクセスされないページを別のFIFOに入れ、
+#   2回目のアクセスがあったものだけをLRUに入れる
+# - ARCCache: 最近1回アクセスされたページのLRUと、2回以上のLRUの大きさを、
+#   捨てたページの履歴(ゴースト)を見ながら調整する
+# - TinyLFUCache (W-TinyLFU): 小さなLRUの窓を通ったページを、Count-Min Sketchで
+#   数えたアクセス頻度が捨てられるページより高いときだけメインに入れる
+#
+# python cache_policies.py [trace_file ...] [--size=N]
+# でヒット率を比べる。trace_fileは1行に1つURLを書いたファイル(アクセスログ)。
+# 指定しなければ、乱数で作ったアクセス列を使う。
+#
+# Note: Please do not use a library like collections.OrderedDict). The goal is
+#       to implement the data structure yourself!
+
+
+# Pageの双方向リスト。先頭が一番最近入れたページ。
+class PageList:
+    def __init__(self: PageList):
+        self.head = None
+        self.tail = None
+        self.size = 0
+
+    # pageを先頭につける
+    def push_front(self: PageList, page: Page) -> None:
+        page.prev = None
+        page.next = self.head
+        if self.head:
+            self.head.prev = page
+        self.head = page
+        if self.tail is None:
+            self.tail = page
+        self.size += 1
+
+    # pageをリストから外す
+    def unlink(self: PageList, page: Page) -> None:
+        if page.prev:
+            page.prev.next = page.next
+        else:
+            self.head = page.next
+        if page.next:
+            page.next.prev = page.prev
+        else:
+            self.tail = page.prev
+        page.prev = None
+        page.next = None
+        self.size -= 1
+
+    # 末尾のページを外して返す
+    def pop_tail(self: PageList) -> Page:
+        page = self.tail
+        self.unlink(page)
+        return page
+
+    # 先頭から順にURLを返す
+    def urls(self: PageList) -> list:
+        urls = []
+        page = self.head
+        while page:
+            urls.append(page.url)
+            page = page.next
+        return urls
+
+
+# LFU: アクセス回数が一番少ないページを捨てる。同じ回数なら一番古いページ。
+#
+# アクセス回数ごとにPageListを持ち、アクセスされたページを1つ上の回数の
+# リストに移す。一番少ない回数(min_count)を覚えておくので、捨てるページも
+# O(1)で見つかる。
+class LFUCache:
+    def __init__(self: LFUCache, n: int):
+        self.cache_size = n
+        self.size = 0
+        self.hash_table = {}  # url -> Page
+        self.lists = {}  # アクセス回数 -> PageList
+        self.min_count = 0
+
+    def access_page(self: LFUCache, url: str, contents: str) -> bool:
+        page = self.hash_table.get(url)
+        if page is not None:
+            page.contents = contents
+            pages = self.lists[page.count]
+            pages.unlink(page)
+            if pages.size == 0:
+                del self.lists[page.count]
+                if self.min_count == page.count:
+                    self.min_count += 1
+            page.count += 1
+            self._add(page)
+            return True
+
+        if self.cache_size <= 0:
+            return False
+        if self.size >= self.cache_size:
+            pages = self.lists[self.min_count]
+            victim = pages.pop_tail()
+            if pages.size == 0:
+                del self.lists[self.min_count]
+            del self.hash_table[victim.url]
+            self.size -= 1
+        page = Page(url, contents)
+        page.count = 1
+        self.hash_table[url] = page
+        self._add(page)
+        self.min_count = 1
+        self.size += 1
+        return False
+
+    def _add(self: LFUCache, page: Page) -> None:
+        if page.count not in self.lists:
+            self.lists[page.count] = PageList()
+        self.lists[page.count].push_front(page)
+
+    # アクセス回数が多い順。同じ回数なら最近アクセスされた順。
+    def get_pages(self: LFUCache) -> list:
+        urls = []
+        for count in sorted(self.lists, reverse=True):
+            urls += self.lists[count].urls()
+        return urls
+
+
+# 2Q (Johnson and Shasha, 1994)
+#
+# 初めてアクセスされたページはFIFOのa1inに入れる。a1inから押し出されたページは
+# URLだけをa1out(ゴースト)に残し、a1outにあるうちにもう一度アクセスされたら
+# LRUのamに入れる。一度しかアクセスされないページ(クロールのスキャンなど)は
+# a1inを通り過ぎるだけなので、amにある頻繁に使われるページは押し出されない。
+#
+# |in_ratio|: a1inの大きさ(キャッシュの大きさに対する割合)
+# |out_ratio|: a1outに覚えておくURLの数(キャッシュの大きさに対する割合)
+class TwoQueueCache:
+    def __init__(self: TwoQueueCache, n: int, in_ratio=0.25, out_ratio=0.5):
+        self.cache_size = n
+        self.in_size = max(1, int(n * in_ratio))
+        self.out_size = max(1, int(n * out_ratio))
+        self.a1in = PageList()
+        self.a1out = PageList()  # contentsを持たないゴースト
+        self.am = PageList()
+        self.hash_table = {}  # url -> Page (a1in, a1out, amのどれか)
+
+    def access_page(self: TwoQueueCache, url: str, contents: str) -> bool:
+        page = self.hash_table.get(url)
+        if page is not None and page.queue is not self.a1out:
+            page.contents = contents
+            if page.queue is self.am:
+                self.am.unlink(page)
+                self.am.push_front(page)
+            # a1inの中では動かさない(FIFO)
+            return True
+
+        if self.cache_size <= 0:
+            return False
+        if page is not None:
+            # a1outにあった: 最近2回目のアクセスがあったので、amに入れる
+            # (場所を空けるときにa1outから消されないように、先に外す)
+            self.a1out.unlink(page)
+            self._reclaim()
+            page.contents = contents
+            page.queue = self.am
+            self.am.push_front(page)
+        else:
+            self._reclaim()
+            page = Page(url, contents)
+            page.queue = self.a1in
+            self.hash_table[url] = page
+            self.a1in.push_front(page)
+        return False
+
+    # 新しいページを入れる場所を空ける
+    def _reclaim(self: TwoQueueCache) -> None:
+        if self.a1in.size + self.am.size < self.cache_size:
+            return
+        if self.a1in.size > self.in_size or self.am.size == 0:
+            page = self.a1in.pop_tail()
+            page.contents = None
+            page.queue = self.a1out
+            self.a1out.push_front(page)
+            if self.a1out.size > self.out_size:
+                del self.hash_table[self.a1out.pop_tail().url]
+        else:
+            del self.hash_table[self.am.pop_tail().url]
+
+    # amの最近アクセスされた順、そのあとa1inの新しい順
+    def get_pages(self: TwoQueueCache) -> list:
+        return self.am.urls() + self.a1in.urls()
+
+
+# ARC (Megiddo and Modha, 2003)
+#
+# t1: 最近1回だけアクセスされたページのLRU
+# t2: 2回以上アクセスされたページのLRU
+# b1, b2: t1, t2から捨てたページのURL(ゴースト)
+# t1とt2を合わせてn個までキャッシュする。b1にあるページがまたアクセスされたら
+# t1を大きくすべきだった、b2なら t2を大きくすべきだったということなので、
+# t1の目標の大きさ|self.target|をその分だけ動かす。
+class ARCCache:
+    def __init__(self: ARCCache, n: int):
+        self.cache_size = n
+        self.target = 0
+        self.t1 = PageList()
+        self.t2 = PageList()
+        self.b1 = PageList()
+        self.b2 = PageList()
+        self.hash_table = {}  # url -> Page (t1, t2, b1, b2のどれか)
+
+    def access_page(self: ARCCache, url: str, contents: str) -> bool:
+        page = self.hash_table.get(url)
+        if page is not None and page.queue in (self.t1, self.t2):
+            page.contents = contents
+            self._move(page, self.t2)
+            return True
+
+        n = self.cache_size
+        if n <= 0:
+            return False
+        if page is not None and page.queue is self.b1:
+            self.target = min(n, self.target + max(self.b2.size // self.b1.size, 1))
+            self._replace(False)
+            page.contents = contents
+            self._move(page, self.t2)
+        elif page is not None:  # b2
+            self.target = max(0, self.target - max(self.b1.size // self.b2.size, 1))
+            self._replace(True)
+            page.contents = contents
+            self._move(page, self.t2)
+        else:
+            if self.t1.size + self.b1.size == n:
+                if self.t1.size < n:
+                    self._drop(self.b1)
+                    self._replace(False)
+                else:
+                    # b1が空で、t1だけでいっぱい
+                    del self.hash_table[self.t1.pop_tail().url]
+            else:
+                total = self.t1.size + self.t2.size + self.b1.size + self.b2.size
+                if total >= n:
+                    if total == 2 * n:
+                        self._drop(self.b2)
+                    self._replace(False)
+            page = Page(url, contents)
+            page.queue = None
+            self.hash_table[url] = page
+            self._move(page, self.t1)
+        return False
+
+    # pageを今のリストから外して、|queue|の先頭につける
+    def _move(self: ARCCache, page: Page, queue: PageList) -> None:
+        if page.queue is not None:
+            page.queue.unlink(page)
+        page.queue = queue
+        queue.push_front(page)
+
+    # ゴーストのリストの一番古いURLを忘れる
+    def _drop(self: ARCCache, ghosts: PageList) -> None:
+        del self.hash_table[ghosts.pop_tail().url]
+
+    # t1かt2の末尾のページを捨てて、URLをb1かb2に残す
+    def _replace(self: ARCCache, in_b2: bool) -> None:
+        if self.t1.size + self.t2.size < self.cache_size:
+            return
+        if self.t1.size > 0 and (
+            self.t1.size > self.target or (in_b2 and self.t1.size == self.target)
+        ):
+            page, ghosts = self.t1.tail, self.b1
+        else:
+            page, ghosts = self.t2.tail, self.b2
+        page.contents = None
+        self._move(page, ghosts)
+
+    # t2の最近アクセスされた順、そのあとt1の最近アクセスされた順
+    def get_pages(self: ARCCache) -> list:
+        return self.t2.urls() + self.t1.urls()
+
+
+# Count-Min Sketch: URLごとのアクセス回数を、決まった大きさのカウンタで
+# 近似して数える(実際より多く数えることはあっても、少なく数えることはない)。
+#
+# 4行のカウンタ(最大15)を持ち、URLのハッシュ値からそれぞれの行の位置を決める。
+# 数えた回数が|sample_size|になったら全部のカウンタを半分にして、
+# 昔のアクセスを少しずつ忘れる。
+class CountMinSketch:
+    ROWS = 4
+    MAX_COUNT = 15
+
+    def __init__(self: CountMinSketch, n: int):
+        self.width = 16
+        while self.width < n:
+            self.width *= 2
+        self.mask = self.width - 1
+        self.counters = bytearray(self.ROWS * self.width)
+        self.sample_size = 10 * self.width
+        self.additions = 0
+
+    # urlのカウンタの位置を返す(2つのハッシュ値の組み合わせで4つ作る)
+    def _indexes(self: CountMinSketch, url: str) -> list:
+        h = hash(url) & 0xFFFFFFFFFFFFFFFF
+        a = h & 0xFFFFFFFF
+        b = (h >> 32) | 1
+        return [
+            row * self.width + ((a + row * b) & self.mask) for row in range(self.ROWS)
+        ]
+
+    def increment(self: CountMinSketch, url: str) -> None:
+        counters = self.counters
+        for i in self._indexes(url):
+            if counters[i] < self.MAX_COUNT:
+                counters[i] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._age()
+
+    def estimate(self: CountMinSketch, url: str) -> int:
+        return min(self.counters[i] for i in self._indexes(url))
+
+    # 全部のカウンタを半分にする(sample_size回に1回なので、1回あたりO(1))
+    def _age(self: CountMinSketch) -> None:
+        self.counters = bytearray(count >> 1 for count in self.counters)
+        self.additions //= 2
+
+
+# W-TinyLFU (Einziger, Friedman and Manes, 2017)
+#
+# window: 新しいページが最初に入る小さなLRU (キャッシュの1%)
+# probation, protected: メインのSegmented LRU。probationで2回目のアクセスが
+#                       あったページはprotected(メインの80%)に移す
+# windowから押し出されたページ(候補)は、メインが一杯なら、probationの末尾の
+# ページ(犠牲)とCountMinSketchで数えた頻度を比べ、候補の方が多いときだけ
+# 犠牲と入れ替える。スキャンのように一度しか来ないページはメインに入れない。
+class TinyLFUCache:
+    def __init__(self: TinyLFUCache, n: int, window_ratio=0.01, protected_ratio=0.8):
+        self.cache_size = n
+        self.window_size = max(1, int(n * window_ratio)) if n > 1 else n
+        self.main_size = n - self.window_size
+        self.protected_size = int(self.main_size * protected_ratio)
+        self.window = PageList()
+        self.probation = PageList()
+        self.protected = PageList()
+        self.sketch = CountMinSketch(n)
+        self.hash_table = {}  # url -> Page
+
+    def access_page(self: TinyLFUCache, url: str, contents: str) -> bool:
+        self.sketch.increment(url)
+        page = self.hash_table.get(url)
+        if page is not None:
+            page.contents = contents
+            if page.queue is self.probation:
+                self._move(page, self.protected)
+                if self.protected.size > self.protected_size:
+                    self._move(self.protected.tail, self.probation)
+            else:
+                self._move(page, page.queue)
+            return True
+
+        if self.cache_size <= 0:
+            return False
+        page = Page(url, contents)
+        page.queue = None
+        self.hash_table[url] = page
+        self._move(page, self.window)
+        if self.window.size > self.window_size:
+            self._admit(self.window.tail)
+        return False
+
+    # windowから押し出された候補を、メインに入れるか捨てる
+    def _admit(self: TinyLFUCache, candidate: Page) -> None:
+        if self.probation.size + self.protected.size < self.main_size:
+            self._move(candidate, self.probation)
+            return
+        victim = self.probation.tail or self.protected.tail
+        if victim is None:
+            self._evict(candidate)  # メインの大きさが0
+        elif self.sketch.estimate(candidate.url) > self.sketch.estimate(victim.url):
+            self._evict(victim)
+            self._move(candidate, self.probation)
+        else:
+            self._evict(candidate)
+
+    def _move(self: TinyLFUCache, page: Page, queue: PageList) -> None:
+        if page.queue is not None:
+            page.queue.unlink(page)
+        page.queue = queue
+        queue.push_front(page)
+
+    def _evict(self: TinyLFUCache, page: Page) -> None:
+        page.queue.unlink(page)
+        del self.hash_table[page.url]
+
+    # windowとprotected, probationの、それぞれ最近アクセスされた順
+    def get_pages(self: TinyLFUCache) -> list:
+        return self.window.urls() + self.protected.urls() + self.probation.urls()
+
+
+POLICIES = [
+    ("LRU", Cache),
+    ("LFU", LFUCache),
+    ("2Q", TwoQueueCache),
+    ("ARC", ARCCache),
+    ("W-TinyLFU", TinyLFUCache),
+]
+
+
+# traceのURLを順番にアクセスして、ヒット率を返す
+def hit_ratio(policy_class, trace: list, n: int) -> float:
+    cache = policy_class(n)
+    hits = 0
+    for url in trace:
+        if cache.access_page(url, url):
+            hits += 1
+    return hits / len(trace) if trace else 0.0
+
+
+# アクセス回数がZipf分布(順位rのURLが 1 / r^alpha に比例)になるアクセス列
+def zipf_trace(length: int, urls: int, alpha: float = 0.9, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    weights = [1 / (rank**alpha) for rank in range(1, urls + 1)]
+    cumulative = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    names = ["page%d.com" % i for i in range(urls)]
+    return rng.choices(names, cum_weights=cumulative, k=length)
+
+
+# Zipfのアクセスの間に、一度しかアクセスされないページのスキャン
+# (クロール)を|scan_every|回ごとに|scan_length|個はさむ
+def scan_trace(
+    length: int, urls: int, scan_every: int, scan_length: int, seed: int = 0
+) -> list:
+    trace = []
+    scan = 0
+    for i, url in enumerate(zipf_trace(length, urls, seed=seed)):
+        trace.append(url)
+        if (i + 1) % scan_every == 0:
+            trace += ["scan%d.com" % (scan + j) for j in range(scan_length)]
+            scan += scan_length
+    return trace
+
+
+# 1行に1つURLを書いたファイルを読む
+def read_trace(path: str) -> list:
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def synthetic_traces() -> list:
+    return [
+        ("zipf", zipf_trace(200000, 20000)),
+        ("zipf + scans", scan_trace(200000, 20000, 5000, 2000)),
+        # キャッシュより少し大きいループ。LRUは全部外れる
+        ("loop", ["loop%d.com" % (i % 1200) for i in range(100000)]),
+    ]
+
+
+# それぞれのtraceで、それぞれのpolicyのヒット率を表示する
+def compare_policies(traces: list, n: int) -> None:
+    print("%-16s" % ("n=%d" % n) + "".join("%11s" % name for name, _ in POLICIES))
+    for trace_name, trace in traces:
+        row = "%-16s" % trace_name
+        for _, policy_class in POLICIES:
+            row += "%10.2f%%" % (100 * hit_ratio(policy_class, trace, n))
+        print(row)
+
+
+def policy_test():
+    for name, policy_class in POLICIES:
+        # 大きさを超えない・ヒットとミスが正しい
+        cache = policy_class(3)
+        assert cache.access_page("a.com", "AAA") == False
+        assert cache.access_page("a.com", "AAA") == True
+        for url in ["b.com", "c.com", "d.com", "e.com", "f.com"]:
+            assert cache.access_page(url, url) == False
+            assert len(cache.get_pages()) <= 3, name
+        assert len(set(cache.get_pages())) == len(cache.get_pages())
+        # 内容が変わってもページは1つ
+        cache = policy_class(3)
+        cache.access_page("a.com", "AAA")
+        assert cache.access_page("a.com", "BBB") == True
+        assert cache.get_pages() == ["a.com"], name
+
+        # キャッシュにあったページだけがヒットになり、アクセスしたページは
+        # キャッシュに入る
+        cache = policy_class(50)
+        for url in zipf_trace(5000, 200, seed=1):
+            cached = cache.get_pages()
+            assert cache.access_page(url, url) == (url in cached), name
+            assert url in cache.get_pages() and len(cache.get_pages()) <= 50, name
+
+        # 大きさ0なら何もキャッシュしない
+        cache = policy_class(0)
+        assert cache.access_page("a.com", "AAA") == False
+        assert cache.access_page("a.com", "AAA") == False
+        assert cache.get_pages() == []
+
+    # LFU: 回数が多い順。同じなら最近の順。一番少ないページを捨てる
+    cache = LFUCache(3)
+    for url in ["a.com", "a.com", "a.com", "b.com", "b.com", "c.com", "d.com"]:
+        cache.access_page(url, url)
+    assert cache.get_pages() == ["a.com", "b.com", "d.com"]
+
+    # スキャンに強い: 何度もアクセスしたページは、一度きりのページの
+    # スキャンで押し出されない
+    for policy_class in [TwoQueueCache, ARCCache, TinyLFUCache]:
+        cache = policy_class(100)
+        hot = ["hot%d.com" % i for i in range(20)]
+        for round in range(5):
+            for url in hot:
+                cache.access_page(url, url)
+            for i in range(50):
+                cache.access_page("warm%d-%d.com" % (round, i), "")
+        for i in range(1000):
+            cache.access_page("scan%d.com" % i, "")
+        for url in hot:
+            assert cache.access_page(url, url) == True, policy_class.__name__
+
+    print("Policy tests passed!")
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    n = 1000
+    for arg in sys.argv[1:]:
+        if arg.startswith("--size="):
+            n = int(arg[len("--size=") :])
+    policy_test()
+    traces = [(path, read_trace(path)) for path in args] or synthetic_traces()
+    compare_policies(traces, n)
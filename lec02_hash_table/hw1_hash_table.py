@@ -1,7 +1,9 @@
 from __future__ import annotations
 from typing import Optional
-import random, sys, time
-
+from array import array
+from hashlib import blake2b
+import gc, itertools, json, mmap, os, random, struct, sys, tempfile, threading, time
+import tracemalloc
 
 ###########################################################################
 #                                                                         #
@@ -15,6 +17,9 @@ import random, sys, time
 
 # Hash function.
 #
+# Note: The hash tables use keyed_hash() below. This function is kept to show
+#       why the hash function matters (see adversarial_test()).
+#
 # |key|: string
 # Return value: a hash value
 def calculate_hash(key: str) -> int:
@@ -26,17 +31,67 @@ def calculate_hash(key: str) -> int:
     return hash % 100000007
 
 
+# A polynomial hash: hash = key[0] * P^(n-1) + key[1] * P^(n-2) + ... mod 2^64.
+#
+# Every character changes every bit of the result, so keys that differ only in
+# the order of their characters ("abc", "cba") or in one digit get very
+# different hashes. calculate_hash() gives only a few thousand different
+# values for numeric keys, which is fatal for open addressing: the colliding
+# keys form one long run of used slots. With chaining, they form long chains.
+#
+# |key|: string
+# Return value: a 64-bit hash value
+def polynomial_hash(key: str) -> int:
+    assert type(key) == str
+    hash = 0
+    for c in key:
+        hash = (hash * 1000003 + ord(c)) & 0xFFFFFFFFFFFFFFFF
+    # Mix the high bits into the low bits that decide the slot.
+    return hash ^ (hash >> 29)
+
+
+# Encode |text| in UTF-8. A lone surrogate is encoded as it is
+# ("surrogatepass") instead of raising an error, so that any str can be
+# hashed by keyed_hash() and saved by MappedHashTable.
+def encode_string(text: str) -> bytes:
+    return text.encode("utf-8", "surrogatepass")
+
+
+# A keyed hash: BLAKE2b of the key with a secret |seed|, cut to 64 bits.
+#
+# polynomial_hash() is fixed, so anyone who knows it can make many keys with
+# the same hash and put all of them in one chain (see adversarial_test()).
+# Each hash table chooses its own random seed, and without the seed the hash
+# of a key cannot be predicted, so such keys cannot be made in advance.
+#
+# |key|: string
+# |seed|: up to 64 bytes
+# Return value: a 64-bit hash value
+def keyed_hash(key: str, seed: bytes) -> int:
+    assert type(key) == str
+    digest = blake2b(encode_string(key), digest_size=8, key=seed).digest()
+    return int.from_bytes(digest, "little")
+
+
+# The number of bytes of the random seed of each hash table.
+SEED_SIZE = 16
+
+
 # An item object that represents one key - value pair in the hash table.
 class Item:
     # |key|: The key of the item. The key must be a string.
     # |value|: The value of the item.
     # |next|: The next item in the linked list. If this is the last item in the
     #         linked list, |next| is None.
-    def __init__(self: Item, key: str, value: any, next: Optional[Item]):
+    # |hash|: The keyed hash of key. It is kept so that resizing does not need to
+    #         hash the key again, and most different keys are told apart
+    #         without comparing the strings.
+    def __init__(self: Item, key: str, value: any, next: Optional[Item], hash: int):
         assert type(key) == str
         self.key = key
         self.value = value
         self.next = next
+        self.hash = hash
 
 
 # The main data structure of the hash table that stores key - value pairs.
@@ -46,14 +101,18 @@ class Item:
 # |self.buckets|: An array of the buckets. self.buckets[hash % self.bucket_size]
 #                 stores a linked list of items whose hash value is |hash|.
 # |self.item_count|: The total number of items in the hash table.
+# |self.seed|: The seed of keyed_hash(). Every table has a different one.
 class HashTable:
     # Initialize the hash table.
-    def __init__(self: HashTable):
+    #
+    # |seed|: The seed of keyed_hash(). A random one is chosen if None.
+    def __init__(self: HashTable, seed: Optional[bytes] = None):
         # Set the initial bucket size to 97. A prime number is chosen to reduce
         # hash conflicts.
         self.bucket_size = 97
         self.buckets = [None] * self.bucket_size  # save item to list
         self.item_count = 0
+        self.seed = seed if seed is not None else os.urandom(SEED_SIZE)
 
     # Put an item to the hash table. If the key already exists, the
     # corresponding value is updated to a new value.
@@ -65,40 +124,42 @@ class HashTable:
     def put(self: HashTable, key: str, value: any) -> bool:
         assert type(key) == str
         self.check_size()  # Note: Don't remove this code.
-        bucket_index = calculate_hash(key) % self.bucket_size
+        hash = keyed_hash(key, self.seed)
+        bucket_index = hash % self.bucket_size
         item = self.buckets[bucket_index]
         while item:
-            if item.key == key:
+            if item.hash == hash and item.key == key:
                 item.value = value
                 return False
             item = item.next
-        new_item = Item(key, value, self.buckets[bucket_index])
+        new_item = Item(key, value, self.buckets[bucket_index], hash)
         self.buckets[bucket_index] = new_item
         self.item_count += 1
         self.change_hash_table_size()
         return True
 
     def change_hash_table_size(self: HashTable) -> None:
-        old_buckets = self.buckets
-        old_buckets_size = self.bucket_size
         if self.size() >= self.bucket_size * 0.7:
-            self.bucket_size = self.bucket_size * 2
-        elif self.size() > 97 and self.size() <= self.bucket_size * 0.3:
-            self.bucket_size = max(97, self.bucket_size // 2)
-        else:
-            return
-        self.buckets = [None] * self.bucket_size  # Initialize
-        self.item_count = 0
+            self._rehash(self.bucket_size * 2)
+        elif self.bucket_size > 97 and self.size() <= self.bucket_size * 0.3:
+            self._rehash(max(97, self.bucket_size // 2))
+
+    # Move all the items to a new bucket array of |new_size| buckets.
+    # The items keep their hash, so each one is just relinked into its new
+    # bucket: no key is hashed again and no Item is allocated.
+    def _rehash(self: HashTable, new_size: int) -> None:
+        old_buckets = self.buckets
+        new_buckets = [None] * new_size
         # 新たなハッシュテーブルに要素を入れ直す
-        for i in range(old_buckets_size):
-            item = old_buckets[i]
+        for item in old_buckets:
             while item:
-                bucket_index = calculate_hash(item.key) % self.bucket_size
-                new_item = Item(item.key, item.value, self.buckets[bucket_index])
-                self.buckets[bucket_index] = new_item
-                self.item_count += 1
-                item = item.next
-        return
+                next_item = item.next
+                bucket_index = item.hash % new_size
+                item.next = new_buckets[bucket_index]
+                new_buckets[bucket_index] = item
+                item = next_item
+        self.buckets = new_buckets
+        self.bucket_size = new_size
 
     # Get an item from the hash table.
     #
@@ -108,10 +169,10 @@ class HashTable:
     def get(self: HashTable, key: str) -> tuple:
         assert type(key) == str
         self.check_size()  # Note: Don't remove this code.
-        bucket_index = calculate_hash(key) % self.bucket_size
-        item = self.buckets[bucket_index]
+        hash = keyed_hash(key, self.seed)
+        item = self.buckets[hash % self.bucket_size]
         while item:
-            if item.key == key:
+            if item.hash == hash and item.key == key:
                 return (item.value, True)
             item = item.next
         return (None, False)
@@ -124,11 +185,12 @@ class HashTable:
     def delete(self: HashTable, key: str) -> bool:
         assert type(key) is str
         # ------------------------#
-        bucket_index = calculate_hash(key) % self.bucket_size
+        hash = keyed_hash(key, self.seed)
+        bucket_index = hash % self.bucket_size
         item = self.buckets[bucket_index]
         prev_item = None
         while item:
-            if item.key == key:
+            if item.hash == hash and item.key == key:
                 if prev_item is None:
                     self.buckets[bucket_index] = item.next
                 else:
@@ -141,6 +203,130 @@ class HashTable:
         # ------------------------#
         return False
 
+    # Put many items at once. The bucket array is sized for all the items
+    # before they are put, so the table is resized at most once instead of
+    # doubling again and again.
+    #
+    # |items|: A list of (key, value).
+    # Return value: A list of the results put() would return for each item.
+    def put_many(self: HashTable, items: list) -> list:
+        self.check_size()  # Note: Don't remove this code.
+        new_size = self._fitting_bucket_size(self.item_count + len(items))
+        if new_size > self.bucket_size:
+            self._rehash(new_size)
+        buckets = self.buckets
+        bucket_size = self.bucket_size
+        results = []
+        for key, value in items:
+            assert type(key) == str
+            hash = keyed_hash(key, self.seed)
+            bucket_index = hash % bucket_size
+            item = buckets[bucket_index]
+            while item:
+                if item.hash == hash and item.key == key:
+                    item.value = value
+                    break
+                item = item.next
+            if item:
+                results.append(False)
+            else:
+                buckets[bucket_index] = Item(key, value, buckets[bucket_index], hash)
+                self.item_count += 1
+                results.append(True)
+        # Some keys may have been there already.
+        self._fit_size()
+        return results
+
+    # Get many items at once.
+    #
+    # |keys|: A list of keys.
+    # Return value: A list of the results get() would return for each key.
+    def get_many(self: HashTable, keys: list) -> list:
+        self.check_size()  # Note: Don't remove this code.
+        buckets = self.buckets
+        bucket_size = self.bucket_size
+        results = []
+        for key in keys:
+            assert type(key) == str
+            hash = keyed_hash(key, self.seed)
+            item = buckets[hash % bucket_size]
+            while item:
+                if item.hash == hash and item.key == key:
+                    results.append((item.value, True))
+                    break
+                item = item.next
+            else:
+                results.append((None, False))
+        return results
+
+    # Delete many items at once. The table is shrunk at most once, at the end.
+    #
+    # |keys|: A list of keys.
+    # Return value: A list of the results delete() would return for each key.
+    def delete_many(self: HashTable, keys: list) -> list:
+        buckets = self.buckets
+        bucket_size = self.bucket_size
+        results = []
+        for key in keys:
+            assert type(key) is str
+            hash = keyed_hash(key, self.seed)
+            bucket_index = hash % bucket_size
+            item = buckets[bucket_index]
+            prev_item = None
+            while item:
+                if item.hash == hash and item.key == key:
+                    if prev_item is None:
+                        buckets[bucket_index] = item.next
+                    else:
+                        prev_item.next = item.next
+                    self.item_count -= 1
+                    break
+                prev_item = item
+                item = item.next
+            results.append(item is not None)
+        self._fit_size()
+        return results
+
+    # Make a hash table that has |items|. The bucket array is allocated once
+    # with the right size.
+    #
+    # |items|: An iterable of (key, value).
+    @classmethod
+    def from_items(cls, items) -> HashTable:
+        hash_table = cls()
+        hash_table.put_many(list(items))
+        return hash_table
+
+    # Return all the (key, value) pairs in the hash table, in no particular
+    # order.
+    def items(self: HashTable):
+        for item in self.buckets:
+            while item:
+                yield item.key, item.value
+                item = item.next
+
+    # Save the hash table to |path| in the format of MappedHashTable.
+    # The values must be strings.
+    def save(self: HashTable, path: str) -> None:
+        MappedHashTable.write(self.items(), self.item_count, path, self.seed)
+
+    # Return the smallest bucket size (97 * 2^k) that keeps |item_count| items
+    # under 70% of the buckets.
+    def _fitting_bucket_size(self: HashTable, item_count: int) -> int:
+        bucket_size = 97
+        while item_count >= bucket_size * 0.7:
+            bucket_size *= 2
+        return bucket_size
+
+    # Resize once after a bulk operation if the table is too full or too empty.
+    def _fit_size(self: HashTable) -> None:
+        new_size = self._fitting_bucket_size(self.item_count)
+        if new_size != self.bucket_size and (
+            self.item_count >= self.bucket_size * 0.7
+            or self.item_count <= self.bucket_size * 0.3
+        ):
+            self._rehash(new_size)
+
     # Return the total number of items in the hash table.
     def size(self: HashTable):
         return self.item_count
@@ -154,9 +340,741 @@ class HashTable:
         assert self.bucket_size < 100 or self.item_count >= self.bucket_size * 0.3
 
 
+# A HashTable that resizes incrementally.
+#
+# HashTable._rehash() moves every item inside one put() or delete(), and
+# allocates a whole new bucket array, which stops that operation for a long
+# time when the table is large. This table resizes its one bucket array in
+# place, MIGRATE_BUCKETS buckets per operation, so every operation does a
+# bounded amount of work and no large array is ever allocated at once.
+#
+# The bucket sizes are always 97 * 2^k, so a resize only doubles or halves
+# the size and every bucket maps onto one or two buckets of the new size:
+# - Growing from N to 2N buckets, bucket i is split into buckets i and i + N.
+#   The buckets are split in order, and bucket i + N is appended to the array
+#   just when bucket i is split.
+# - Shrinking from 2N to N buckets, the last bucket j is merged into bucket
+#   j - N and popped from the array, until N buckets are left.
+# While a resize is in progress, bucket_index() tells from |hash| whether the
+# bucket of the key is already split or merged, so every item is found
+# without moving anything else first.
+#
+# |self.bucket_size|: The bucket size after the resize in progress.
+# |self.base_size|: The bucket size before the resize in progress, or None if
+#                   no resize is in progress.
+# |self.split_index|: While growing, the buckets before this index are split.
+class IncrementalHashTable(HashTable):
+    # The number of buckets split or merged on each operation. A resize ends
+    # within base_size / 16 operations, before the next resize can start
+    # (that needs at least 10% of base_size puts or deletes).
+    MIGRATE_BUCKETS = 16
+
+    def __init__(self: IncrementalHashTable, seed: Optional[bytes] = None):
+        super().__init__(seed)
+        self.base_size = None
+        self.split_index = 0
+
+    # Split or merge the next MIGRATE_BUCKETS buckets (or all of the remaining
+    # ones if |all| is True).
+    def migrate(self: IncrementalHashTable, all: bool = False) -> None:
+        buckets = self.buckets
+        bucket_size = self.bucket_size
+        if bucket_size > self.base_size:
+            end = self.base_size
+            if not all:
+                end = min(end, self.split_index + self.MIGRATE_BUCKETS)
+            for i in range(self.split_index, end):
+                buckets.append(None)  # bucket i + base_size
+                item = buckets[i]
+                buckets[i] = None
+                while item:
+                    next_item = item.next
+                    bucket_index = item.hash % bucket_size
+                    item.next = buckets[bucket_index]
+                    buckets[bucket_index] = item
+                    item = next_item
+            self.split_index = end
+        else:
+            end = bucket_size
+            if not all:
+                end = max(end, len(buckets) - self.MIGRATE_BUCKETS)
+            while len(buckets) > end:
+                item = buckets.pop()
+                while item:
+                    next_item = item.next
+                    bucket_index = item.hash % bucket_size
+                    item.next = buckets[bucket_index]
+                    buckets[bucket_index] = item
+                    item = next_item
+        if len(buckets) == bucket_size:
+            self.base_size = None
+
+    # Return the index of the bucket where the item with |hash| is (or would
+    # be).
+    def bucket_index(self: IncrementalHashTable, hash: int) -> int:
+        if self.base_size is None:
+            return hash % self.bucket_size
+        index = hash % self.base_size
+        if self.bucket_size > self.base_size:
+            if index < self.split_index:  # already split
+                index = hash % self.bucket_size
+        elif index >= len(self.buckets):  # already merged
+            index -= self.bucket_size
+        return index
+
+    def put(self: IncrementalHashTable, key: str, value: any) -> bool:
+        assert type(key) == str
+        self.check_size()  # Note: Don't remove this code.
+        if self.base_size is not None:
+            self.migrate()
+        hash = keyed_hash(key, self.seed)
+        bucket_index = self.bucket_index(hash)
+        item = self.buckets[bucket_index]
+        while item:
+            if item.hash == hash and item.key == key:
+                item.value = value
+                return False
+            item = item.next
+        self.buckets[bucket_index] = Item(key, value, self.buckets[bucket_index], hash)
+        self.item_count += 1
+        self.change_hash_table_size()
+        return True
+
+    def get(self: IncrementalHashTable, key: str) -> tuple:
+        assert type(key) == str
+        self.check_size()  # Note: Don't remove this code.
+        if self.base_size is not None:
+            self.migrate()
+        hash = keyed_hash(key, self.seed)
+        item = self.buckets[self.bucket_index(hash)]
+        while item:
+            if item.hash == hash and item.key == key:
+                return (item.value, True)
+            item = item.next
+        return (None, False)
+
+    def delete(self: IncrementalHashTable, key: str) -> bool:
+        assert type(key) is str
+        if self.base_size is not None:
+            self.migrate()
+        hash = keyed_hash(key, self.seed)
+        bucket_index = self.bucket_index(hash)
+        item = self.buckets[bucket_index]
+        prev_item = None
+        while item:
+            if item.hash == hash and item.key == key:
+                if prev_item is None:
+                    self.buckets[bucket_index] = item.next
+                else:
+                    prev_item.next = item.next
+                self.item_count -= 1
+                self.change_hash_table_size()
+                return True
+            prev_item = item
+            item = item.next
+        return False
+
+    # The bulk operations of HashTable find buckets by hash % bucket_size, so
+    # finish the resize in progress first. A bulk operation touches every item
+    # anyway.
+    def put_many(self: IncrementalHashTable, items: list) -> list:
+        if self.base_size is not None:
+            self.migrate(all=True)
+        return super().put_many(items)
+
+    def get_many(self: IncrementalHashTable, keys: list) -> list:
+        if self.base_size is not None:
+            self.migrate(all=True)
+        return super().get_many(keys)
+
+    def delete_many(self: IncrementalHashTable, keys: list) -> list:
+        if self.base_size is not None:
+            self.migrate(all=True)
+        return super().delete_many(keys)
+
+    # Start a resize with the same thresholds as HashTable. The buckets are
+    # split or merged later by migrate().
+    def change_hash_table_size(self: IncrementalHashTable) -> None:
+        if self.size() >= self.bucket_size * 0.7:
+            new_size = self.bucket_size * 2
+        elif self.bucket_size > 97 and self.size() <= self.bucket_size * 0.3:
+            new_size = self.bucket_size // 2
+        else:
+            return
+        # A resize normally ends long before the next one starts (see
+        # MIGRATE_BUCKETS). Finish it if not.
+        if self.base_size is not None:
+            self.migrate(all=True)
+        self.base_size = self.bucket_size
+        self.split_index = 0
+        self.bucket_size = new_size
+
+
+# A histogram of operation latencies.
+#
+# A latency of t nanoseconds goes to a bin chosen from the highest bits of t:
+# each power of two is split into SUB_BINS bins, so a percentile is accurate
+# to about 1 / SUB_BINS of its value however many operations are recorded.
+#
+# |self.bins|: self.bins[i] is the number of latencies in bin i.
+# |self.count|: The number of latencies recorded.
+# |self.total|: The sum of the latencies in seconds.
+# |self.max|: The largest latency in seconds.
+class LatencyHistogram:
+    SUB_BITS = 3
+    SUB_BINS = 1 << SUB_BITS
+
+    def __init__(self: LatencyHistogram):
+        self.bins = [0] * (64 * self.SUB_BINS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    # |seconds|: The latency of one operation.
+    def record(self: LatencyHistogram, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.bins[self.bin_index(int(seconds * 1e9))] += 1
+
+    def bin_index(self: LatencyHistogram, ns: int) -> int:
+        bits = ns.bit_length()
+        if bits <= self.SUB_BITS:
+            return ns
+        # The top SUB_BITS + 1 bits of ns. The highest one is always 1.
+        top = ns >> (bits - self.SUB_BITS - 1)
+        return (bits - self.SUB_BITS) * self.SUB_BINS + top - self.SUB_BINS
+
+    # Return the largest latency in nanoseconds that goes to bin |index|.
+    def bin_limit(self: LatencyHistogram, index: int) -> int:
+        if index < self.SUB_BINS:
+            return index
+        shift = index // self.SUB_BINS - 1
+        top = index % self.SUB_BINS + self.SUB_BINS
+        return ((top + 1) << shift) - 1
+
+    # Return the |p|-th percentile in seconds (0 if nothing is recorded).
+    def percentile(self: LatencyHistogram, p: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = self.count * p / 100
+        seen = 0
+        for index, count in enumerate(self.bins):
+            seen += count
+            if count and seen >= rank:
+                return min(self.bin_limit(index) / 1e9, self.max)
+        return self.max
+
+    def summary(self: LatencyHistogram) -> dict:
+        return {
+            "count": self.count,
+            "mean_us": self.total / self.count * 1e6 if self.count else 0.0,
+            "p50_us": self.percentile(50) * 1e6,
+            "p99_us": self.percentile(99) * 1e6,
+            "max_us": self.max * 1e6,
+        }
+
+
+# A HashTable that records what happens inside it, to find out whether a
+# slowdown comes from the hash function (long chains), the load factor or
+# resizing:
+# - the latency of each put / get / delete (LatencyHistogram)
+# - the number of items compared in the chain on each operation (probes)
+# - the load factor every LOAD_SAMPLE_INTERVAL operations and at each resize
+# - the number and the duration of resizes
+# - the distribution of the chain lengths (computed when stats() is called)
+#
+# The probes are counted outside the timed part, so counting them does not
+# change the latencies.
+class InstrumentedHashTable(HashTable):
+    LOAD_SAMPLE_INTERVAL = 1000
+
+    def __init__(self: InstrumentedHashTable, seed: Optional[bytes] = None):
+        super().__init__(seed)
+        self.latencies = {
+            "put": LatencyHistogram(),
+            "get": LatencyHistogram(),
+            "delete": LatencyHistogram(),
+        }
+        self.probe_counts = {"put": 0, "get": 0, "delete": 0}
+        self.max_probes = 0
+        self.operation_count = 0
+        # A list of (operation count, load factor).
+        self.load_factors = []
+        self.resize_count = 0
+        self.resize_seconds = 0.0
+        self.max_resize_seconds = 0.0
+
+    # Return the number of items that are compared to find |key|.
+    def count_probes(self: InstrumentedHashTable, key: str) -> int:
+        hash = keyed_hash(key, self.seed)
+        item = self.buckets[hash % self.bucket_size]
+        probes = 0
+        while item:
+            probes += 1
+            if item.hash == hash and item.key == key:
+                break
+            item = item.next
+        return probes
+
+    def record(self: InstrumentedHashTable, operation: str, begin: float) -> None:
+        self.latencies[operation].record(time.perf_counter() - begin)
+        self.operation_count += 1
+        if self.operation_count % self.LOAD_SAMPLE_INTERVAL == 0:
+            self.load_factors.append(
+                (self.operation_count, self.item_count / self.bucket_size)
+            )
+
+    def put(self: InstrumentedHashTable, key: str, value: any) -> bool:
+        probes = self.count_probes(key)
+        self.probe_counts["put"] += probes
+        self.max_probes = max(self.max_probes, probes)
+        begin = time.perf_counter()
+        result = super().put(key, value)
+        self.record("put", begin)
+        return result
+
+    def get(self: InstrumentedHashTable, key: str) -> tuple:
+        probes = self.count_probes(key)
+        self.probe_counts["get"] += probes
+        self.max_probes = max(self.max_probes, probes)
+        begin = time.perf_counter()
+        result = super().get(key)
+        self.record("get", begin)
+        return result
+
+    def delete(self: InstrumentedHashTable, key: str) -> bool:
+        probes = self.count_probes(key)
+        self.probe_counts["delete"] += probes
+        self.max_probes = max(self.max_probes, probes)
+        begin = time.perf_counter()
+        result = super().delete(key)
+        self.record("delete", begin)
+        return result
+
+    def _rehash(self: InstrumentedHashTable, new_size: int) -> None:
+        begin = time.perf_counter()
+        super()._rehash(new_size)
+        seconds = time.perf_counter() - begin
+        self.resize_count += 1
+        self.resize_seconds += seconds
+        self.max_resize_seconds = max(self.max_resize_seconds, seconds)
+        self.load_factors.append(
+            (self.operation_count, self.item_count / self.bucket_size)
+        )
+
+    # Return a list whose i-th element is the number of buckets with i items.
+    def chain_lengths(self: InstrumentedHashTable) -> list:
+        counts = [0]
+        for item in self.buckets:
+            length = 0
+            while item:
+                length += 1
+                item = item.next
+            while len(counts) <= length:
+                counts.append(0)
+            counts[length] += 1
+        return counts
+
+    # Return everything recorded so far.
+    def stats(self: InstrumentedHashTable) -> dict:
+        latencies = {}
+        for operation, histogram in self.latencies.items():
+            latencies[operation] = histogram.summary()
+            latencies[operation]["mean_probes"] = (
+                self.probe_counts[operation] / histogram.count
+                if histogram.count
+                else 0.0
+            )
+        return {
+            "item_count": self.item_count,
+            "bucket_size": self.bucket_size,
+            "load_factor": self.item_count / self.bucket_size,
+            "operations": latencies,
+            "max_probes": self.max_probes,
+            "chain_lengths": self.chain_lengths(),
+            "load_factors": self.load_factors,
+            "resizes": {
+                "count": self.resize_count,
+                "total_ms": self.resize_seconds * 1000,
+                "max_ms": self.max_resize_seconds * 1000,
+            },
+        }
+
+    # Write stats() to |path| as JSON.
+    def dump_json(self: InstrumentedHashTable, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.stats(), f, indent=2)
+
+
+# A HashTable that many threads can use at the same time.
+#
+# The items are split into |stripes| segments by their hash. Each segment is
+# an ordinary HashTable with its own lock, so threads that use different
+# segments do not wait for each other. A segment grows and shrinks by itself
+# while holding its lock, so readers of the segment never see a half-moved
+# bucket array, and the other segments are not stopped.
+#
+# |self.segments|: The list of HashTables.
+# |self.locks|: self.locks[i] protects self.segments[i].
+class ConcurrentHashTable:
+    def __init__(self: ConcurrentHashTable, stripes: int = 16):
+        self.segments = [HashTable() for _ in range(stripes)]
+        self.locks = [threading.Lock() for _ in range(stripes)]
+
+    # Return the index of the segment for |key|.
+    # Python's own string hash is used here because it is computed once per
+    # string object and cached, so choosing the segment costs almost nothing
+    # and the key is hashed with keyed_hash() only inside the segment.
+    # It is also independent of keyed_hash(), so the keys of one segment
+    # still spread over all of its buckets.
+    def stripe(self: ConcurrentHashTable, key: str) -> int:
+        return hash(key) % len(self.segments)
+
+    def put(self: ConcurrentHashTable, key: str, value: any) -> bool:
+        assert type(key) == str
+        i = self.stripe(key)
+        with self.locks[i]:
+            return self.segments[i].put(key, value)
+
+    def get(self: ConcurrentHashTable, key: str) -> tuple:
+        assert type(key) == str
+        i = self.stripe(key)
+        with self.locks[i]:
+            return self.segments[i].get(key)
+
+    def delete(self: ConcurrentHashTable, key: str) -> bool:
+        assert type(key) is str
+        i = self.stripe(key)
+        with self.locks[i]:
+            return self.segments[i].delete(key)
+
+    # Return the total number of items. The segments are counted one by one,
+    # so the result may be off while other threads are putting or deleting.
+    def size(self: ConcurrentHashTable) -> int:
+        return sum(segment.size() for segment in self.segments)
+
+    # Check the bucket size of every segment.
+    def check_size(self: ConcurrentHashTable):
+        for i, segment in enumerate(self.segments):
+            with self.locks[i]:
+                segment.check_size()
+
+
+# A HashTable protected by one lock, to compare with ConcurrentHashTable.
+# Only one thread can use it at a time.
+class LockedHashTable:
+    def __init__(self: LockedHashTable):
+        self.table = HashTable()
+        self.lock = threading.Lock()
+
+    def put(self: LockedHashTable, key: str, value: any) -> bool:
+        with self.lock:
+            return self.table.put(key, value)
+
+    def get(self: LockedHashTable, key: str) -> tuple:
+        with self.lock:
+            return self.table.get(key)
+
+    def delete(self: LockedHashTable, key: str) -> bool:
+        with self.lock:
+            return self.table.delete(key)
+
+    def size(self: LockedHashTable) -> int:
+        return self.table.size()
+
+    def check_size(self: LockedHashTable):
+        with self.lock:
+            self.table.check_size()
+
+
+# A hash table with open addressing (linear probing).
+#
+# Instead of one Item object per entry, the keys, the values and the hashes
+# are stored in three flat arrays. An entry whose hash is |hash| is stored in
+# slot hash % bucket_size, or in the first free slot after it. A lookup walks
+# the slots from there until it finds the key or an empty slot, so it reads
+# neighbouring elements of the same arrays instead of following pointers.
+#
+# Deletion uses "backward shift": the entries after the deleted slot are moved
+# back into the hole when that is still on their probe path. This keeps the
+# rule "there is no empty slot between an entry and its home slot" without
+# leaving tombstones behind.
+#
+# |self.bucket_size|: The number of slots.
+# |self.keys|: self.keys[i] is the key in slot i, or None if the slot is empty.
+# |self.values|: self.values[i] is the value in slot i.
+# |self.hashes|: self.hashes[i] is the keyed hash of self.keys[i]. It is kept
+#                so that resizing and comparing keys need not hash strings
+#                again.
+# |self.item_count|: The total number of items in the hash table.
+# |self.seed|: The seed of keyed_hash().
+class OpenAddressingHashTable:
+    def __init__(self: OpenAddressingHashTable, seed: Optional[bytes] = None):
+        self.bucket_size = 97
+        self.keys = [None] * self.bucket_size
+        self.values = [None] * self.bucket_size
+        self.hashes = array("Q", [0]) * self.bucket_size
+        self.item_count = 0
+        self.seed = seed if seed is not None else os.urandom(SEED_SIZE)
+
+    # Return the slot that has |key|, or the empty slot where it would be put.
+    def find_slot(self: OpenAddressingHashTable, key: str, hash: int) -> int:
+        keys = self.keys
+        hashes = self.hashes
+        index = hash % self.bucket_size
+        while True:
+            slot_key = keys[index]
+            if slot_key is None or (hashes[index] == hash and slot_key == key):
+                return index
+            index += 1
+            if index == self.bucket_size:
+                index = 0
+
+    # Put an item to the hash table. If the key already exists, the
+    # corresponding value is updated to a new value.
+    #
+    # Return value: True if a new item is added. False if the key already exists
+    #               and the value is updated.
+    def put(self: OpenAddressingHashTable, key: str, value: any) -> bool:
+        assert type(key) == str
+        self.check_size()  # Note: Don't remove this code.
+        hash = keyed_hash(key, self.seed)
+        index = self.find_slot(key, hash)
+        if self.keys[index] is not None:
+            self.values[index] = value
+            return False
+        self.keys[index] = key
+        self.values[index] = value
+        self.hashes[index] = hash
+        self.item_count += 1
+        self.change_hash_table_size()
+        return True
+
+    # Double / halve the number of slots in the same way as HashTable.
+    # The load factor never goes over 70%, so there is always an empty slot
+    # that ends each probe.
+    def change_hash_table_size(self: OpenAddressingHashTable) -> None:
+        if self.item_count >= self.bucket_size * 0.7:
+            new_size = self.bucket_size * 2
+        elif self.bucket_size > 97 and self.item_count <= self.bucket_size * 0.3:
+            new_size = max(97, self.bucket_size // 2)
+        else:
+            return
+        old_keys, old_values, old_hashes = self.keys, self.values, self.hashes
+        self.bucket_size = new_size
+        self.keys = [None] * new_size
+        self.values = [None] * new_size
+        self.hashes = array("Q", [0]) * new_size
+        keys, values, hashes = self.keys, self.values, self.hashes
+        for i in range(len(old_keys)):
+            key = old_keys[i]
+            if key is None:
+                continue
+            hash = old_hashes[i]
+            # The keys are all different, so only an empty slot is needed.
+            index = hash % new_size
+            while keys[index] is not None:
+                index += 1
+                if index == new_size:
+                    index = 0
+            keys[index] = key
+            values[index] = old_values[i]
+            hashes[index] = hash
+
+    # Get an item from the hash table.
+    #
+    # Return value: If the item is found, (the value of the item, True) is
+    #               returned. Otherwise, (None, False) is returned.
+    def get(self: OpenAddressingHashTable, key: str) -> tuple:
+        assert type(key) == str
+        self.check_size()  # Note: Don't remove this code.
+        index = self.find_slot(key, keyed_hash(key, self.seed))
+        if self.keys[index] is None:
+            return (None, False)
+        return (self.values[index], True)
+
+    # Delete an item from the hash table.
+    #
+    # Return value: True if the item is found and deleted successfully. False
+    #               otherwise.
+    def delete(self: OpenAddressingHashTable, key: str) -> bool:
+        assert type(key) is str
+        hole = self.find_slot(key, keyed_hash(key, self.seed))
+        if self.keys[hole] is None:
+            return False
+
+        keys, values, hashes = self.keys, self.values, self.hashes
+        index = hole
+        while True:
+            index += 1
+            if index == self.bucket_size:
+                index = 0
+            if keys[index] is None:
+                break
+            home = hashes[index] % self.bucket_size
+            # The entry can move to the hole only if the hole is between its
+            # home slot and its current slot (going around the end).
+            if hole <= index:
+                can_move = home <= hole or home > index
+            else:
+                can_move = home <= hole and home > index
+            if can_move:
+                keys[hole] = keys[index]
+                values[hole] = values[index]
+                hashes[hole] = hashes[index]
+                hole = index
+        keys[hole] = None
+        values[hole] = None
+        self.item_count -= 1
+        self.change_hash_table_size()
+        return True
+
+    # Return the total number of items in the hash table.
+    def size(self: OpenAddressingHashTable):
+        return self.item_count
+
+    # The same check as HashTable.check_size().
+    #
+    # Note: Don't change this function.
+    def check_size(self: OpenAddressingHashTable):
+        assert self.bucket_size < 100 or self.item_count >= self.bucket_size * 0.3
+
+
+# A read-only hash table that reads a file saved by HashTable.save() through
+# mmap.
+#
+# Opening the file reads only the header, so a table with tens of millions of
+# items opens at once. get() reads the slot and the key / value bytes directly
+# from the mapped pages, and the OS loads only the pages that are used. All
+# the processes that open the same file share those pages.
+#
+# The file is (all the numbers are little endian):
+#   header: MAGIC, the number of slots, the number of items, the seed
+#   slots:  the slot array of open addressing (linear probing). Each slot is
+#           (keyed_hash(key, seed), the offset of the entry in the file), and
+#           the offset is 0 if the slot is empty.
+#   heap:   the entries. Each entry is (length of key, length of value) and
+#           then the key and the value in UTF-8.
+#
+# |self.slot_count|: The number of slots. It is a power of two.
+# |self.item_count|: The total number of items.
+# |self.seed|: The seed of keyed_hash() that the file was written with.
+class MappedHashTable:
+    MAGIC = b"HTBL"
+    # magic, the number of slots, the number of items, the seed
+    HEADER = struct.Struct("<4s4xQQ%ds" % SEED_SIZE)
+    SLOT = struct.Struct("<QQ")
+    ENTRY = struct.Struct("<II")
+
+    # |path|: The file saved by HashTable.save().
+    def __init__(self: MappedHashTable, path: str):
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) < self.HEADER.size:
+            magic = None
+        else:
+            magic, self.slot_count, self.item_count, self.seed = (
+                self.HEADER.unpack_from(self.data)
+            )
+        if magic != self.MAGIC:
+            self.data.close()
+            raise ValueError("%s is not a hash table file" % path)
+
+    # Write (key, value) pairs to |path|.
+    #
+    # |items|: An iterable of (key, value). The keys must be different and the
+    #          values must be strings.
+    # |item_count|: The number of items in |items|.
+    # |seed|: The seed of keyed_hash() (SEED_SIZE bytes).
+    @classmethod
+    def write(cls, items, item_count: int, path: str, seed: bytes) -> None:
+        slot_count = 1
+        while item_count >= slot_count * 0.7:
+            slot_count *= 2
+        # slots[2 * i] is the hash and slots[2 * i + 1] is the offset of slot i.
+        slots = array("Q", [0]) * (2 * slot_count)
+        offset = cls.HEADER.size + cls.SLOT.size * slot_count
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.seek(offset)
+            for key, value in items:
+                assert type(key) == str and type(value) == str
+                hash = keyed_hash(key, seed)
+                index = hash & (slot_count - 1)
+                while slots[2 * index + 1]:
+                    index = (index + 1) & (slot_count - 1)
+                slots[2 * index] = hash
+                slots[2 * index + 1] = offset
+                key_bytes = encode_string(key)
+                value_bytes = encode_string(value)
+                f.write(cls.ENTRY.pack(len(key_bytes), len(value_bytes)))
+                f.write(key_bytes)
+                f.write(value_bytes)
+                offset += cls.ENTRY.size + len(key_bytes) + len(value_bytes)
+
+            if sys.byteorder == "big":  # The file is little endian.
+                slots.byteswap()
+            f.seek(0)
+            f.write(cls.HEADER.pack(cls.MAGIC, slot_count, item_count, seed))
+            f.write(slots.tobytes())
+        os.replace(tmp_path, path)
+
+    # Get an item from the hash table.
+    #
+    # Return value: If the item is found, (the value of the item, True) is
+    #               returned. Otherwise, (None, False) is returned.
+    def get(self: MappedHashTable, key: str) -> tuple:
+        assert type(key) == str
+        data = self.data
+        hash = keyed_hash(key, self.seed)
+        key_bytes = encode_string(key)
+        mask = self.slot_count - 1
+        index = hash & mask
+        while True:
+            slot_hash, offset = self.SLOT.unpack_from(
+                data, self.HEADER.size + self.SLOT.size * index
+            )
+            if offset == 0:
+                return (None, False)
+            if slot_hash == hash:
+                key_length, value_length = self.ENTRY.unpack_from(data, offset)
+                start = offset + self.ENTRY.size
+                if data[start : start + key_length] == key_bytes:
+                    start += key_length
+                    value = data[start : start + value_length]
+                    return (value.decode("utf-8", "surrogatepass"), True)
+            index = (index + 1) & mask
+
+    # Return the total number of items in the hash table.
+    def size(self: MappedHashTable) -> int:
+        return self.item_count
+
+    def close(self: MappedHashTable) -> None:
+        self.data.close()
+
+    def __enter__(self: MappedHashTable) -> MappedHashTable:
+        return self
+
+    def __exit__(self: MappedHashTable, *args) -> None:
+        self.close()
+
+
+# The hash tables that can be tested from the command line.
+TABLE_CLASSES = [
+    ("chaining", HashTable),
+    ("incremental", IncrementalHashTable),
+    ("open", OpenAddressingHashTable),
+]
+
+
 # Test the functional behavior of the hash table.
-def functional_test():
-    hash_table = HashTable()
+#
+# |table_class|: The hash table class to test.
+def functional_test(table_class=HashTable):
+    hash_table = table_class()
 
     assert hash_table.put("aaa", 1) == True
     assert hash_table.get("aaa") == (1, True)
@@ -217,7 +1135,343 @@ def functional_test():
     assert hash_table.delete("acb") == True
     assert hash_table.delete("cab") == True
     assert hash_table.size() == 0
-    print("Functional tests passed!")
+
+    # Many items, so that the table grows and shrinks several times and
+    # deletion has to move entries back.
+    for i in range(1000):
+        assert hash_table.put(str(i), i) == True
+    for i in range(0, 1000, 2):
+        assert hash_table.delete(str(i)) == True
+    for i in range(1000):
+        assert hash_table.get(str(i)) == ((i, True) if i % 2 else (None, False))
+    for i in range(1, 1000, 2):
+        assert hash_table.delete(str(i)) == True
+    assert hash_table.size() == 0
+    print("Functional tests passed! (%s)" % table_class.__name__)
+
+
+# Test the operations while the table is resizing. Read, update and delete
+# every key right after putting it, so that many of the operations happen
+# while a resize is in progress.
+#
+# |table_class|: The hash table class to test.
+# |count|: The number of keys to put and delete.
+def resize_test(table_class=HashTable, count: int = 20000):
+    hash_table = table_class()
+    keys = [str(i * 7919) for i in range(count)]
+    for i, key in enumerate(keys):
+        assert hash_table.put(key, i) == True
+        assert hash_table.get(key) == (i, True)
+        assert hash_table.put(key, -i) == False
+        assert hash_table.size() == i + 1
+    hash_table.check_size()
+    for i, key in enumerate(keys):
+        assert hash_table.get(key) == (-i, True)
+    for i, key in enumerate(keys):
+        assert hash_table.delete(key) == True
+        assert hash_table.get(key) == (None, False)
+        assert hash_table.delete(key) == False
+        if i + 1 < count:
+            assert hash_table.get(keys[i + 1]) == (-(i + 1), True)
+    assert hash_table.size() == 0
+    hash_table.check_size()
+    print("Resize tests passed! (%s)" % table_class.__name__)
+
+
+# Test the bulk operations (put_many, get_many, delete_many, from_items) and
+# compare their speed with one put / get / delete per item.
+#
+# |table_class|: The hash table class to test. It must be HashTable or its
+#                subclass.
+def bulk_test(table_class=HashTable):
+    hash_table = table_class.from_items([("aaa", 1), ("bbb", 2), ("aaa", 3)])
+    assert hash_table.size() == 2
+    assert hash_table.get("aaa") == (3, True)
+    assert hash_table.put_many([("bbb", 4), ("ccc", 5)]) == [False, True]
+    assert hash_table.get_many(["aaa", "bbb", "ccc", "ddd"]) == [
+        (3, True),
+        (4, True),
+        (5, True),
+        (None, False),
+    ]
+    assert hash_table.delete_many(["aaa", "ddd", "aaa"]) == [True, False, False]
+    assert hash_table.size() == 2
+
+    # Grow and shrink in one step, and mix bulk and single operations.
+    keys = [str(i) for i in range(10000)]
+    assert hash_table.put_many([(key, key) for key in keys]) == [True] * len(keys)
+    hash_table.check_size()
+    for key in keys[:5000]:
+        assert hash_table.delete(key) == True
+    assert (
+        hash_table.put_many([(key, 0) for key in keys])
+        == [True] * 5000 + [False] * 5000
+    )
+    assert hash_table.delete_many(keys[100:]) == [True] * (len(keys) - 100)
+    hash_table.check_size()
+    assert hash_table.get_many(keys[:200]) == [(0, True)] * 100 + [(None, False)] * 100
+    assert hash_table.size() == 102
+    print("Bulk tests passed! (%s)" % table_class.__name__)
+
+    items = [(str(i * 7919), i) for i in range(300000)]
+    keys = [key for key, _ in items]
+    begin = time.time()
+    hash_table = table_class()
+    for key, value in items:
+        hash_table.put(key, value)
+    for key in keys:
+        hash_table.get(key)
+    for key in keys:
+        hash_table.delete(key)
+    middle = time.time()
+    hash_table = table_class.from_items(items)
+    hash_table.get_many(keys)
+    hash_table.delete_many(keys)
+    end = time.time()
+    print(
+        "%s: one by one %.2f s, bulk %.2f s"
+        % (table_class.__name__, middle - begin, end - middle)
+    )
+
+
+# Run a small workload on InstrumentedHashTable, check what it recorded and
+# print the summary.
+#
+# |json_file|: If given, the statistics are also written to this file.
+def instrumentation_test(json_file: Optional[str] = None) -> dict:
+    hash_table = InstrumentedHashTable()
+    functional_test(InstrumentedHashTable)
+    keys = [str(i * 7919) for i in range(100000)]
+    for key in keys:
+        hash_table.put(key, key)
+    for key in keys:
+        hash_table.get(key)
+    for key in keys:
+        hash_table.delete(key)
+
+    stats = hash_table.stats()
+    for operation in ["put", "get", "delete"]:
+        summary = stats["operations"][operation]
+        assert summary["count"] == len(keys)
+        assert summary["p50_us"] <= summary["p99_us"] <= summary["max_us"]
+        print(
+            "%-6s p50 %.2f us, p99 %.2f us, max %.2f us, %.2f probes"
+            % (
+                operation,
+                summary["p50_us"],
+                summary["p99_us"],
+                summary["max_us"],
+                summary["mean_probes"],
+            )
+        )
+    assert (
+        stats["item_count"] == 0 and sum(stats["chain_lengths"]) == stats["bucket_size"]
+    )
+    assert stats["resizes"]["count"] > 0
+    print(
+        "%d resizes, %.1f ms in total, %.1f ms at most"
+        % (
+            stats["resizes"]["count"],
+            stats["resizes"]["total_ms"],
+            stats["resizes"]["max_ms"],
+        )
+    )
+    if json_file:
+        hash_table.dump_json(json_file)
+    print("Instrumentation tests passed!")
+    return stats
+
+
+# Let |threads| threads put, get and delete at the same time and check that
+# no update is lost. Each thread owns its own keys, so the final contents are
+# known. All threads also read and overwrite a few shared keys, which makes
+# them use the same segments at the same time.
+#
+# |table_class|: The thread-safe hash table class to test.
+# Return value: The number of operations per second.
+def concurrency_test(
+    table_class=ConcurrentHashTable, threads: int = 4, count: int = 20000
+) -> float:
+    hash_table = table_class()
+    shared_keys = ["shared%d" % i for i in range(16)]
+    errors = []
+
+    def work(thread_id: int) -> None:
+        try:
+            rng = random.Random(thread_id)
+            keys = ["%d-%d" % (thread_id, i) for i in range(count)]
+            for i, key in enumerate(keys):
+                assert hash_table.put(key, i) == True
+                shared = rng.choice(shared_keys)
+                hash_table.put(shared, thread_id)
+                value, found = hash_table.get(shared)
+                assert found and 0 <= value < threads
+            for i, key in enumerate(keys):
+                assert hash_table.get(key) == (i, True)
+            # Delete every other key, so that the segments shrink while the
+            # other threads are still reading them.
+            for key in keys[::2]:
+                assert hash_table.delete(key) == True
+        except AssertionError as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+    begin = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    end = time.time()
+
+    assert not errors, errors
+    for thread_id in range(threads):
+        for i in range(count):
+            expected = (None, False) if i % 2 == 0 else (i, True)
+            assert hash_table.get("%d-%d" % (thread_id, i)) == expected
+    assert hash_table.size() == threads * (count // 2) + len(shared_keys)
+    hash_table.check_size()
+
+    # put, get for the own keys and the shared key, get, delete
+    operations = threads * count * 4 + threads * (count + 1) // 2
+    print(
+        "%s: %d threads, %.0f operations/s"
+        % (table_class.__name__, threads, operations / (end - begin))
+    )
+    return operations / (end - begin)
+
+
+# Save a HashTable, open it with MappedHashTable and check that every item is
+# read back. Also compare the time to build the table from its items with the
+# time to open the saved file.
+#
+# |count|: The number of items.
+def persistence_test(count: int = 200000) -> None:
+    items = [(str(i * 7919), "value%d" % i) for i in range(count)]
+    items.append(("ключ", "значение"))  # not ASCII
+    items.append(("", ""))
+    items.append(("\ud800", "\udfff"))  # lone surrogates
+
+    begin = time.time()
+    hash_table = HashTable.from_items(items)
+    built = time.time()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "table.bin")
+        hash_table.save(path)
+        saved = time.time()
+        with MappedHashTable(path) as mapped:
+            opened = time.time()
+            assert mapped.size() == len(items)
+            for key, value in items:
+                assert mapped.get(key) == (value, True)
+            for i in range(1000):
+                assert mapped.get("missing%d" % i) == (None, False)
+            end = time.time()
+
+        with open(path, "wb") as f:
+            f.write(b"not a hash table")
+        try:
+            MappedHashTable(path)
+            assert False
+        except ValueError:
+            pass
+
+    print(
+        "%d items: build %.2f s, save %.2f s, open %.6f s, get %.2f us"
+        % (
+            len(items),
+            built - begin,
+            saved - built,
+            opened - saved,
+            (end - opened) / (len(items) + 1000) * 1e6,
+        )
+    )
+    print("Persistence tests passed!")
+
+
+# Return (the longest chain, the average number of items compared by a get()
+# of an existing key) when |keys| are put in a chaining table of
+# |bucket_size| buckets with |hash_function|.
+def chain_statistics(keys: list, hash_function, bucket_size: int) -> tuple:
+    lengths = [0] * bucket_size
+    for key in keys:
+        lengths[hash_function(key) % bucket_size] += 1
+    # The i-th item of a chain is found after i comparisons.
+    compares = sum(length * (length + 1) // 2 for length in lengths)
+    return max(lengths), compares / len(keys)
+
+
+# Return a list of (name, keys) of key sets that are hard for some hash
+# functions.
+#
+# |count|: The number of keys in each set (at most 2^15).
+def adversarial_keys(count: int) -> list:
+    # calculate_hash() multiplies the i-th character by i, so it ignores the
+    # first character.
+    legacy = [chr(0x100 + i) + "collision" for i in range(count)]
+    # polynomial_hash() adds a * P + b for two characters a, b, and
+    # "a" + chr(P + 100) and "b" + chr(100) give the same a * P + b. Any
+    # string made of these two blocks has the same hash.
+    blocks = ["a" + chr(1000003 + 100), "b" + chr(100)]
+    polynomial = [
+        "".join(blocks[(i >> bit) & 1] for bit in range(15)) for i in range(count)
+    ]
+    return [
+        (
+            "anagrams",
+            [
+                "".join(p)
+                for p in itertools.islice(itertools.permutations("abcdefgh"), count)
+            ],
+        ),
+        (
+            "common prefix",
+            ["https://example.com/users/%d/profile" % i for i in range(count)],
+        ),
+        ("numbers", [str(i) for i in range(count)]),
+        ("calculate_hash collisions", legacy),
+        ("polynomial_hash collisions", polynomial),
+    ]
+
+
+# Put key sets that are hard for some hash functions (see adversarial_keys())
+# and compare the chains that calculate_hash(), polynomial_hash() and
+# keyed_hash() would make. The fixed hash functions put every crafted key in
+# one chain, so get() becomes O(n). The keyed hash must keep every get()
+# near O(1), and the time of get() is measured on a real HashTable.
+#
+# |count|: The number of keys in each set.
+def adversarial_test(count: int = 20000) -> None:
+    seed = os.urandom(SEED_SIZE)
+    hash_functions = [
+        ("calculate_hash", calculate_hash),
+        ("polynomial_hash", polynomial_hash),
+        ("keyed_hash", lambda key: keyed_hash(key, seed)),
+    ]
+    bucket_size = HashTable()._fitting_bucket_size(count)
+    print(
+        "%-28s" % "max chain / compares"
+        + "".join("%18s" % name for name, _ in hash_functions)
+        + "%12s" % "get"
+    )
+    for name, keys in adversarial_keys(count):
+        assert len(set(keys)) == count
+        row = "%-28s" % name
+        for hash_name, hash_function in hash_functions:
+            longest, compares = chain_statistics(keys, hash_function, bucket_size)
+            row += "%10d /%6.1f" % (longest, compares)
+            if hash_name == "keyed_hash":
+                assert compares < 2, name
+            elif name.startswith(hash_name):
+                assert longest == count  # The attack works.
+
+        hash_table = HashTable.from_items((key, i) for i, key in enumerate(keys))
+        begin = time.time()
+        for i, key in enumerate(keys):
+            assert hash_table.get(key) == (i, True)
+        end = time.time()
+        row += "%9.2f us" % ((end - begin) / count * 1e6)
+        print(row)
+    print("Adversarial tests passed!")
 
 
 # Test the performance of the hash table.
@@ -228,8 +1482,12 @@ def functional_test():
 # goal, you will need to 1) implement rehashing (Hint: expand / shrink the hash
 # table when the number of items in the hash table hits some threshold) and
 # 2) tweak the hash function (Hint: think about ways to reduce hash conflicts).
-def performance_test():
-    hash_table = HashTable()
+#
+# |table_class|: The hash table class to test.
+# Return value: The total execution time in seconds.
+def performance_test(table_class=HashTable) -> float:
+    hash_table = table_class()
+    total = 0
 
     for iteration in range(100):
         begin = time.time()
@@ -242,18 +1500,122 @@ def performance_test():
             rand = random.randint(0, 100000000)
             hash_table.get(str(rand))
         end = time.time()
+        total += end - begin
         print("%d %.6f" % (iteration, end - begin))
 
+    begin = time.time()
     for iteration in range(100):
         random.seed(iteration)
         for i in range(10000):
             rand = random.randint(0, 100000000)
             hash_table.delete(str(rand))
+    total += time.time() - begin
 
     assert hash_table.size() == 0
-    print("Performance tests passed!")
+    print("Performance tests passed! (%s: %.2f s)" % (table_class.__name__, total))
+    return total
+
+
+# Measure the memory that the hash table itself uses per item (the key and
+# value strings are created before the measurement and are not counted).
+#
+# |table_class|: The hash table class to test.
+# |count|: The number of items to put.
+# Return value: The number of bytes per item.
+def memory_test(table_class=HashTable, count: int = 100000) -> float:
+    keys = [str(i) for i in range(count)]
+    tracemalloc.start()
+    hash_table = table_class()
+    for key in keys:
+        hash_table.put(key, key)
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("%s: %.1f bytes per item" % (table_class.__name__, used / count))
+    return used / count
+
+
+# How much slower the slowest put() of IncrementalHashTable may get from the
+# smallest size to the largest size in tail_latency_test(). A slowest put()
+# faster than MIN_LATENCY is counted as MIN_LATENCY.
+MAX_LATENCY_RATIO = 10
+MIN_LATENCY = 0.001
+
+
+# Measure the slowest single put() while the table grows to each of |sizes|
+# items. With HashTable, the slowest put() is the one that resizes the whole
+# table, so it grows with the table size. With IncrementalHashTable, it
+# should stay about the same.
+#
+# The garbage collector is stopped during the measurement, because its pauses
+# also grow with the number of objects but have nothing to do with the table.
+# The whole measurement is repeated and the smallest of the slowest puts is
+# kept for each size, because the machine itself sometimes pauses a few ms
+# (even an empty loop does) and such a pause only hits one of the runs.
+#
+# For IncrementalHashTable, assert that the slowest put at the largest size is
+# within MAX_LATENCY_RATIO times the one at the smallest size.
+#
+# |table_class|: The hash table class to test.
+# |sizes|: The numbers of items to measure at, in increasing order.
+# |repeat|: The number of times to repeat the measurement.
+# Return value: A list of (size, the slowest put() in seconds).
+def tail_latency_test(
+    table_class=HashTable, sizes: list = [10000, 100000, 1000000], repeat: int = 3
+) -> list:
+    slowest = [float("inf")] * len(sizes)
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            hash_table = table_class()
+            worst = 0
+            i = 0
+            for j, size in enumerate(sizes):
+                while i < size:
+                    key = str(i * 7919)
+                    begin = time.perf_counter()
+                    hash_table.put(key, key)
+                    worst = max(worst, time.perf_counter() - begin)
+                    i += 1
+                slowest[j] = min(slowest[j], worst)
+            del hash_table
+    finally:
+        gc.enable()
+    results = list(zip(sizes, slowest))
+    for size, worst in results:
+        print(
+            "%s: %d items, slowest put %.3f ms"
+            % (table_class.__name__, size, worst * 1000)
+        )
+    if issubclass(table_class, IncrementalHashTable):
+        assert slowest[-1] <= max(slowest[0], MIN_LATENCY) * MAX_LATENCY_RATIO, (
+            "The slowest put grows with the table size: %s" % results
+        )
+    return results
 
 
+# python hw1_hash_table.py [chaining] [incremental] [open]
+# Run the tests for the given hash tables (all of them if none is given) and
+# compare the results.
 if __name__ == "__main__":
-    functional_test()
-    performance_test()
+    names = sys.argv[1:] or [name for name, _ in TABLE_CLASSES]
+    classes = [table_class for name, table_class in TABLE_CLASSES if name in names]
+    results = []
+    for table_class in classes:
+        functional_test(table_class)
+        resize_test(table_class)
+        results.append((table_class, performance_test(table_class)))
+    for table_class, total in results:
+        print("%-24s %.2f s" % (table_class.__name__, total))
+        memory_test(table_class)
+    for table_class in classes:
+        tail_latency_test(table_class)
+    for table_class in classes:
+        if issubclass(table_class, HashTable):
+            bulk_test(table_class)
+    instrumentation_test()
+    for threads in [1, 4, 8]:
+        for table_class in [LockedHashTable, ConcurrentHashTable]:
+            concurrency_test(table_class, threads)
+    print("Concurrency tests passed!")
+    persistence_test()
+    adversarial_test()
@@ -1,5 +1,6 @@
 from __future__ import annotations
 from typing import Optional
+import heapq, queue, random, threading, time, tracemalloc
 
 # Implement a data structure that stores the most recently accessed N pages.
 # See the below test cases to see how it should work.
@@ -8,6 +9,16 @@ from typing import Optional
 #       to implement the data structure yourself!
 
 
+# contentsのバイト数(UTF-8)を返す。
+# ASCIIだけの文字列なら、encodeしてコピーを作らずに長さだけで分かる。
+def content_bytes(contents) -> int:
+    if isinstance(contents, (bytes, bytearray)):
+        return len(contents)
+    if contents.isascii():
+        return len(contents)
+    return len(contents.encode("utf-8"))
+
+
 class Page:
     def __init__(
         self: Page,
@@ -20,6 +31,7 @@ class Page:
         self.contents = contents
         self.prev = prev
         self.next = next
+        self.bytes = content_bytes(contents)  # contentsのバイト数
 
     # これは確認用
     def __str__(self):
@@ -33,64 +45,85 @@ class Page:
 class Cache:
     # Initialize the cache.
     # |n|: The size of the cache.、
-    def __init__(self: Cache, n: int):
+    # |max_bytes|: キャッシュするcontentsの合計バイト数の上限 (Noneなら制限なし)
+    def __init__(self: Cache, n: int, max_bytes: Optional[int] = None):
         self.head = None  # 先頭のポインタ
         self.tail = None  # 末尾のポインタ
         self.cache_size = n
+        self.max_bytes = max_bytes
         self.size = 0
-        self.hash_table = {}
+        self.total_bytes = 0  # キャッシュにあるcontentsの合計バイト数
+        self.hash_table = {}  # url -> Page
 
     # Access a page and update the cache so that it stores the most recently
     # accessed N pages. This needs to be done with mostly O(1).
     # |url|: The accessed URL
     # |contents|: The contents of the URL
-    def access_page(self: Cache, url: str, contents: str) -> None:
+    # Return value: True if the URL was in the cache (hit). False otherwise.
+    def access_page(self: Cache, url: str, contents: str) -> bool:
         # ------------------------#
-        if (url, contents) in self.hash_table:
-            page = self.hash_table[(url, contents)]
-            if page is self.head:  # 先頭のページだったらそのまま返す
-                return
-
-            # ページを一旦削除
-            if page.prev:
-                page.prev.next = page.next
-            if page.next:
-                page.next.prev = page.prev
-            if page is self.tail:
-                self.tail = page.prev
-
-            # ページを先頭に持ってくる
-            page.next = self.head
-            page.prev = None
-            if self.head:
-                self.head.prev = page
-            self.head = page
-
+        # urlだけをkeyにするので、大きなcontentsをハッシュしない
+        page = self.hash_table.get(url)
+        hit = page is not None
+        if hit:
+            if page.contents != contents:
+                # 内容が変わっていたら、同じPageのまま書き換える
+                size = content_bytes(contents)
+                self.total_bytes += size - page.bytes
+                page.contents = contents
+                page.bytes = size
+            if page is not self.head:  # 先頭のページだったら動かさない
+                self._unlink(page)
+                self._push_front(page)
         else:
             # keyがハッシュテーブルになければ新たに作る
             page = Page(url, contents, None, None)
-            self.hash_table[(url, contents)] = page
-            if self.head is None:
-                self.head = page
-            else:
-                page.next = self.head
-                page.prev = None
-                self.head.prev = page
-                self.head = page
-
-            if self.tail is None:
-                self.tail = page
-
+            self.hash_table[url] = page
+            self._push_front(page)
             self.size += 1
+            self.total_bytes += page.bytes
+
+        if self.max_bytes is not None and page.bytes > self.max_bytes:
+            # 1ページだけで上限を超えるものはキャッシュしない
+            self._remove(page)
 
-        if self.size > self.cache_size:
-            del self.hash_table[(self.tail.url, self.tail.contents)]
-            if self.tail.prev:
-                self.tail.prev.next = None
-            self.tail = self.tail.prev
-            self.size -= 1
+        while self.size > self.cache_size or (
+            self.max_bytes is not None and self.total_bytes > self.max_bytes
+        ):
+            self._remove(self.tail)
 
         # ------------------------#
+        return hit
+
+    # pageを連結リストから外す
+    def _unlink(self: Cache, page: Page) -> None:
+        if page.prev:
+            page.prev.next = page.next
+        else:
+            self.head = page.next
+        if page.next:
+            page.next.prev = page.prev
+        else:
+            self.tail = page.prev
+        page.prev = None
+        page.next = None
+
+    # pageを連結リストの先頭につける
+    def _push_front(self: Cache, page: Page) -> None:
+        page.prev = None
+        page.next = self.head
+        if self.head:
+            self.head.prev = page
+        self.head = page
+        if self.tail is None:
+            self.tail = page
+
+    # pageをキャッシュから削除する
+    def _remove(self: Cache, page: Page) -> None:
+        self._unlink(page)
+        del self.hash_table[page.url]
+        self.size -= 1
+        self.total_bytes -= page.bytes
 
     # Return the URLs stored in the cache. The URLs are ordered in the order
     # in which the URLs are mostly recently accessed.
@@ -106,10 +139,297 @@ class Cache:
         # print(pages)
         return pages
 
+    # urlのキャッシュされている内容を返す(なければNone)。アクセスの順番は変えない
+    def get_contents(self: Cache, url: str) -> Optional[str]:
+        page = self.hash_table.get(url)
+        return page.contents if page is not None else None
+
+
+# Cacheと同じことを、Pageを作らずに行う。
+#
+# n個の場所(スロット)を最初に作っておき、url・contents・バイト数・前と次の
+# スロットの番号を、スロットの番号で引く配列に入れておく。新しいページは
+# 空いているスロットに入れ、空きがなければ捨てるページのスロットをそのまま
+# 使い回すので、アクセスのたびにオブジェクトを作ったり捨てたりしない。
+#
+# |self.urls|, |self.contents|, |self.bytes|: スロットごとのurl・内容・バイト数
+# |self.prev|, |self.next|: スロットごとの前・次のスロットの番号(なければ-1)。
+#                           array('i')は読むたびにintのオブジェクトを作るので
+#                           遅く、リストにしている
+# |self.free|: 空いているスロットの番号
+# |self.hash_table|: url -> スロットの番号
+class ArrayCache:
+    def __init__(self: ArrayCache, n: int, max_bytes: Optional[int] = None):
+        slots = max(n, 0)
+        self.cache_size = n
+        self.max_bytes = max_bytes
+        self.urls = [None] * slots
+        self.contents = [None] * slots
+        self.bytes = [0] * slots
+        self.prev = [-1] * slots
+        self.next = [-1] * slots
+        self.free = list(range(slots - 1, -1, -1))
+        self.head = -1  # 先頭のスロット
+        self.tail = -1  # 末尾のスロット
+        self.size = 0
+        self.total_bytes = 0
+        self.hash_table = {}
+
+    # 属性を何度も引くと遅いので、よく使う配列はローカル変数に入れておく。
+    # ヒットしたページを先頭に移すのも、_unlinkと_push_frontを呼ばずにここで行う
+    def access_page(self: ArrayCache, url: str, contents: str) -> bool:
+        slot = self.hash_table.get(url)
+        if slot is not None:
+            contents_array = self.contents
+            if contents_array[slot] != contents:
+                size = content_bytes(contents)
+                self.total_bytes += size - self.bytes[slot]
+                contents_array[slot] = contents
+                self.bytes[slot] = size
+            head = self.head
+            if slot != head:
+                prev_array = self.prev
+                next_array = self.next
+                # slotを外す (先頭ではないので、前のスロットはある)
+                prev = prev_array[slot]
+                next = next_array[slot]
+                next_array[prev] = next
+                if next != -1:
+                    prev_array[next] = prev
+                else:
+                    self.tail = prev
+                # 先頭に入れる
+                prev_array[slot] = -1
+                next_array[slot] = head
+                prev_array[head] = slot
+                self.head = slot
+            if self.max_bytes is not None:
+                self._fit_max_bytes(slot)
+            return True
+
+        size = content_bytes(contents)
+        if self.cache_size <= 0 or (
+            self.max_bytes is not None and size > self.max_bytes
+        ):
+            # Cacheと同じく、入らないページのために他のページを捨てない
+            return False
+        if not self.free:
+            # 一杯なので、一番古いページのスロットを使い回す
+            self._remove(self.tail)
+        slot = self.free.pop()
+        self.urls[slot] = url
+        self.contents[slot] = contents
+        self.bytes[slot] = size
+        self.hash_table[url] = slot
+        self._push_front(slot)
+        self.size += 1
+        self.total_bytes += size
+        if self.max_bytes is not None:
+            self._fit_max_bytes(slot)
+        return False
+
+    # 合計バイト数がmax_bytesを超えていたら、古いページから捨てる
+    def _fit_max_bytes(self: ArrayCache, slot: int) -> None:
+        if self.bytes[slot] > self.max_bytes:
+            # 1ページだけで上限を超えるものはキャッシュしない
+            self._remove(slot)
+        while self.total_bytes > self.max_bytes:
+            self._remove(self.tail)
+
+    def _unlink(self: ArrayCache, slot: int) -> None:
+        prev = self.prev[slot]
+        next = self.next[slot]
+        if prev != -1:
+            self.next[prev] = next
+        else:
+            self.head = next
+        if next != -1:
+            self.prev[next] = prev
+        else:
+            self.tail = prev
+
+    def _push_front(self: ArrayCache, slot: int) -> None:
+        self.prev[slot] = -1
+        self.next[slot] = self.head
+        if self.head != -1:
+            self.prev[self.head] = slot
+        self.head = slot
+        if self.tail == -1:
+            self.tail = slot
+
+    # slotのページを捨てて、スロットを空きに戻す
+    def _remove(self: ArrayCache, slot: int) -> None:
+        self._unlink(slot)
+        del self.hash_table[self.urls[slot]]
+        self.size -= 1
+        self.total_bytes -= self.bytes[slot]
+        self.urls[slot] = None
+        self.contents[slot] = None
+        self.free.append(slot)
+
+    def get_pages(self: ArrayCache) -> list:
+        pages = []
+        slot = self.head
+        while slot != -1:
+            pages.append(self.urls[slot])
+            slot = self.next[slot]
+        return pages
+
+    def get_contents(self: ArrayCache, url: str) -> Optional[str]:
+        slot = self.hash_table.get(url)
+        return self.contents[slot] if slot is not None else None
+
 
-def cache_test():
+# ページに有効期限(TTL)をつけたCache。
+#
+# 期限の切れたページは、アクセスしたときに見つけたらミスとして扱う(lazy expiry)。
+# 期限が延びるのは、新しくページを入れたとき・内容が変わったとき・ttlを
+# 渡したとき・fetchし直したときだけで、同じ内容でヒットしても延びない。
+# アクセスされないまま期限の切れたページがLRUのリストに残らないように、
+# (期限, url)のヒープ(heapq)からも期限の早い順に取り出して捨てる(1つO(log n))。
+# 期限を延ばしたときは古い組をヒープに残したままにして、取り出したときに
+# ページの今の期限と比べて読み飛ばす。
+#
+# get(url, fetch)では、期限が切れてもstale_ttl秒の間は古い内容をすぐに返し、
+# そのurlについて1つだけスレッドを立ててfetchし直す(stale-while-revalidate)。
+# スレッドはfetchした結果をSimpleQueueに入れるだけで、キャッシュを書き換えるのは
+# 次にアクセスしたときのメインのスレッドなので、ロックはいらない。
+#
+# |ttl|: ページの有効期限の秒数。省略すると期限なし
+#        (access_pageやgetでページごとにも変えられる)
+# |stale_ttl|: 期限が切れてから古い内容を返してよい秒数
+# |clock|: 今の時刻(秒)を返す関数 (テストで時刻を進めるため)
+class ExpiringCache(Cache):
+    def __init__(
+        self: ExpiringCache,
+        n: int,
+        ttl: float = float("inf"),
+        max_bytes: Optional[int] = None,
+        stale_ttl: float = 0.0,
+        clock=time.monotonic,
+    ):
+        super().__init__(n, max_bytes)
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.clock = clock
+        self.expiry_heap = []  # (もう返せなくなる時刻, url)
+        self.refreshing = set()  # fetchし直しているurl
+        self.results = queue.SimpleQueue()  # (url, contents, ttl, 例外)
+
+    # contentsをttl秒の間有効なページとしてキャッシュする。すでにあるページは、
+    # 内容が変わったかttlを渡したときだけ期限を延ばす
+    def access_page(
+        self: ExpiringCache, url: str, contents: str, ttl: Optional[float] = None
+    ) -> bool:
+        self.drain_refreshes()
+        now = self.clock()
+        self.expire(now)
+        page = self.hash_table.get(url)
+        if page is not None and page.expires <= now:
+            # 期限が切れていたらミス
+            self._remove(page)
+            page = None
+        renewed = page is None or ttl is not None or page.contents != contents
+        hit = super().access_page(url, contents)
+        page = self.hash_table.get(url)
+        if page is not None and renewed:
+            self._set_expiry(page, now + (self.ttl if ttl is None else ttl))
+        return hit
+
+    # urlの内容を返す。キャッシュになければfetch(url)で取ってきて入れる。
+    # 期限切れからstale_ttl秒以内なら古い内容を返し、裏でfetchし直す。
+    def get(self: ExpiringCache, url: str, fetch, ttl: Optional[float] = None):
+        self.drain_refreshes()
+        now = self.clock()
+        self.expire(now)
+        page = self.hash_table.get(url)
+        if page is not None and now < page.expires + self.stale_ttl:
+            if page is not self.head:
+                self._unlink(page)
+                self._push_front(page)
+            if page.expires <= now and url not in self.refreshing:
+                self.refreshing.add(url)
+                threading.Thread(
+                    target=self._refresh, args=(url, fetch, ttl), daemon=True
+                ).start()
+            return page.contents
+        contents = fetch(url)
+        self.access_page(url, contents, ttl)
+        return contents
+
+    # 別のスレッドで動く。fetchした結果をキューに入れるだけ
+    def _refresh(self: ExpiringCache, url: str, fetch, ttl: Optional[float]) -> None:
+        try:
+            self.results.put((url, fetch(url), ttl, None))
+        except Exception as error:
+            self.results.put((url, None, ttl, error))
+
+    # fetchし直した結果をキャッシュに入れる。
+    # |timeout|: Noneでなければ、fetchし直しが全部終わるまで最大timeout秒待つ
+    def drain_refreshes(self: ExpiringCache, timeout: Optional[float] = None) -> None:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.refreshing:
+            try:
+                if deadline is None:
+                    url, contents, ttl, error = self.results.get_nowait()
+                else:
+                    remaining = max(deadline - time.monotonic(), 0)
+                    url, contents, ttl, error = self.results.get(timeout=remaining)
+            except queue.Empty:
+                return
+            self.refreshing.discard(url)
+            # 失敗したときや、その間に捨てられたページはそのままにする
+            page = self.hash_table.get(url)
+            if error is None and page is not None:
+                self._replace(page, contents, ttl)
+
+    # fetchし直した内容をpageに入れて期限を延ばす。ユーザーのアクセスでは
+    # ないので、LRUのリストの順番は変えない
+    def _replace(
+        self: ExpiringCache, page: Page, contents: str, ttl: Optional[float]
+    ) -> None:
+        size = content_bytes(contents)
+        self.total_bytes += size - page.bytes
+        page.contents = contents
+        page.bytes = size
+        self._set_expiry(page, self.clock() + (self.ttl if ttl is None else ttl))
+        if self.max_bytes is not None:
+            if page.bytes > self.max_bytes:
+                self._remove(page)
+            while self.total_bytes > self.max_bytes:
+                self._remove(self.tail)
+
+    # もう古い内容も返せないページを、期限の早い順に捨てる
+    def expire(self: ExpiringCache, now: Optional[float] = None) -> int:
+        if now is None:
+            now = self.clock()
+        removed = 0
+        heap = self.expiry_heap
+        while heap and heap[0][0] <= now:
+            _, url = heapq.heappop(heap)
+            page = self.hash_table.get(url)
+            if page is not None and page.expires + self.stale_ttl <= now:
+                self._remove(page)
+                removed += 1
+        return removed
+
+    # pageの有効期限を決める (Pageにexpiresを足すのはここだけ)
+    def _set_expiry(self: ExpiringCache, page: Page, expires: float) -> None:
+        page.expires = expires
+        heapq.heappush(self.expiry_heap, (expires + self.stale_ttl, page.url))
+        if len(self.expiry_heap) > 2 * self.size + 16:
+            # 古い組が増えすぎたら、今あるページだけで作り直す
+            self.expiry_heap = [
+                (page.expires + self.stale_ttl, page.url)
+                for page in self.hash_table.values()
+            ]
+            heapq.heapify(self.expiry_heap)
+
+
+# |cache_class|: テストするキャッシュのクラス (Cache か ArrayCache)
+def cache_test(cache_class=Cache):
     # Set the size of the cache to 4.
-    cache = Cache(4)
+    cache = cache_class(4)
 
     # Initially, no page is cached.
     assert cache.get_pages() == []
@@ -184,7 +504,7 @@ def cache_test():
     assert cache.get_pages() == ["a.com", "e.com", "f.com", "c.com"]
 
     # set the cache size 1
-    cache = Cache(1)
+    cache = cache_class(1)
     cache.access_page("a.com", "AAA")
     assert cache.get_pages() == ["a.com"]
 
@@ -192,11 +512,235 @@ def cache_test():
     cache.access_page("b.com", "BBB")
     assert cache.get_pages() == ["b.com"]
 
-    print("Tests passed!")
+    print("Tests passed! (%s)" % cache_class.__name__)
+
+
+# urlだけをkeyにすることと、バイト数の上限のテスト
+def byte_budget_test(cache_class=Cache):
+    # 内容が変わっても、同じurlのページは1つだけ
+    cache = cache_class(4)
+    assert cache.access_page("a.com", "AAA") == False
+    cache.access_page("b.com", "BBB")
+    assert cache.access_page("a.com", "AAAAAA") == True
+    assert cache.get_pages() == ["a.com", "b.com"]
+    assert cache.get_contents("a.com") == "AAAAAA"
+    assert cache.get_contents("c.com") is None
+    assert cache.total_bytes == 9
+
+    # 合計10バイトまで
+    cache = cache_class(4, max_bytes=10)
+    cache.access_page("a.com", "AAAA")
+    cache.access_page("b.com", "BBBB")
+    assert cache.get_pages() == ["b.com", "a.com"]
+    # 4 + 4 + 4 > 10 なので、一番古い "a.com" を捨てる
+    cache.access_page("c.com", "CCCC")
+    assert cache.get_pages() == ["c.com", "b.com"]
+    assert cache.total_bytes == 8
+    # "b.com" が大きくなったので "c.com" も入らなくなる
+    cache.access_page("b.com", "BBBBBBBB")
+    assert cache.get_pages() == ["b.com"]
+    assert cache.total_bytes == 8
+    # 上限より大きいページはキャッシュしない(前の内容も捨てる)
+    cache.access_page("d.com", "D" * 11)
+    assert cache.get_pages() == ["b.com"]
+    cache.access_page("b.com", "B" * 11)
+    assert cache.get_pages() == []
+    assert cache.total_bytes == 0 and cache.size == 0
+    # UTF-8のバイト数で数える ("あ" は3バイト)
+    cache.access_page("e.com", "あああ")
+    cache.access_page("f.com", "FF")
+    assert cache.get_pages() == ["f.com"]
+
+    print("Byte budget tests passed! (%s)" % cache_class.__name__)
+
+
+# 期限(TTL)とstale-while-revalidateのテスト
+def expiry_test():
+    now = [0.0]
+    clock = lambda: now[0]
+
+    cache = ExpiringCache(4, ttl=10, clock=clock)
+    assert cache.access_page("a.com", "AA") == False
+    assert cache.access_page("b.com", "B", ttl=30) == False
+    now[0] = 5
+    assert cache.access_page("a.com", "AA") == True
+    assert cache.get_pages() == ["a.com", "b.com"]
+    # 同じ内容でヒットしても期限は延びない (別に作った同じ文字列でも)
+    now[0] = 9
+    assert cache.access_page("a.com", "".join(["A", "A"])) == True
+    now[0] = 10
+    assert cache.access_page("a.com", "AA") == False
+    # ttlを渡せば、同じ内容でも期限は延びる
+    now[0] = 12
+    assert cache.access_page("a.com", "AA", ttl=2) == True
+    now[0] = 13
+    assert cache.access_page("a.com", "AA") == True
+    now[0] = 14
+    assert cache.access_page("a.com", "AA") == False
+    # 内容が変われば期限は延びる
+    now[0] = 15
+    assert cache.access_page("a.com", "A2") == True
+    now[0] = 24
+    assert cache.access_page("a.com", "A2") == True
+    # アクセスしなくても、期限の切れたページはヒープから捨てられる
+    now[0] = 26
+    cache.access_page("c.com", "C")
+    assert cache.get_pages() == ["c.com", "b.com"]
+    now[0] = 31
+    assert cache.expire() == 1
+    assert cache.get_pages() == ["c.com"]
+    assert cache.size == 1 and cache.total_bytes == 1
+    # 何度期限を延ばしても、ヒープは大きくならない
+    for i in range(1000):
+        cache.access_page("c.com", "C%d" % i)
+    assert len(cache.expiry_heap) <= 2 * cache.size + 16
+
+    # getはなければfetchし、期限内ならfetchしない
+    fetched = []
+    gate = threading.Event()
+    gate.set()
+
+    def fetch(url):
+        fetched.append(url)
+        gate.wait()
+        return "%s@%d" % (url, now[0])
+
+    now[0] = 0
+    cache = ExpiringCache(4, ttl=10, stale_ttl=5, clock=clock)
+    assert cache.get("a.com", fetch) == "a.com@0"
+    now[0] = 9
+    assert cache.get("a.com", fetch) == "a.com@0"
+    assert fetched == ["a.com"]
+    # 期限が切れてもstale_ttlの間は古い内容を返し、裏でfetchし直すのは1回だけ
+    # (gateを閉じて、fetchし直しが終わらないうちに2回getする)
+    now[0] = 12
+    gate.clear()
+    assert cache.get("a.com", fetch) == "a.com@0"
+    assert cache.get("a.com", fetch) == "a.com@0"
+    gate.set()
+    cache.drain_refreshes(timeout=5)
+    assert fetched == ["a.com", "a.com"]
+    assert cache.get("a.com", fetch) == "a.com@12"
+    assert cache.get_contents("a.com") == "a.com@12"
+    # stale_ttlも過ぎたら、その場でfetchする
+    now[0] = 30
+    assert cache.get("a.com", fetch) == "a.com@30"
+    assert fetched == ["a.com", "a.com", "a.com"]
+
+    # fetchし直した結果を入れても、LRUの順番は変わらない
+    assert cache.get("b.com", fetch) == "b.com@30"
+    now[0] = 41
+    gate.clear()
+    assert cache.get("a.com", fetch) == "a.com@30"
+    assert cache.get("b.com", fetch) == "b.com@30"
+    gate.set()
+    assert cache.get_pages() == ["b.com", "a.com"]
+    cache.drain_refreshes(timeout=5)
+    assert cache.get_pages() == ["b.com", "a.com"]
+    assert cache.get_contents("a.com") == "a.com@41"
+    assert cache.get_contents("b.com") == "b.com@41"
+
+    # fetchし直しに失敗したら古い内容のまま
+    def broken(url):
+        raise IOError(url)
+
+    now[0] = 52
+    assert cache.get("a.com", broken) == "a.com@41"
+    cache.drain_refreshes(timeout=5)
+    assert cache.get_contents("a.com") == "a.com@41"
+    assert not cache.refreshing
+
+    print("Expiry tests passed!")
+
+
+# 人気のページの期限が切れたときに、getにかかる時間の最大を比べる。
+# stale_ttlがなければ、期限が切れるたびにその場で遅いfetchを待つことになる。
+def stale_while_revalidate_benchmark(fetch_seconds: float = 0.02) -> None:
+    def fetch(url):
+        time.sleep(fetch_seconds)
+        return url
+
+    rng = random.Random(0)
+    urls = ["page%d.com" % rng.randrange(10) for _ in range(500)]
+    for stale_ttl in [0.0, 1.0]:
+        cache = ExpiringCache(100, ttl=0.05, stale_ttl=stale_ttl)
+        for url in set(urls):
+            cache.get(url, fetch)
+        latencies = []
+        for url in urls:
+            begin = time.perf_counter()
+            cache.get(url, fetch)
+            latencies.append(time.perf_counter() - begin)
+            time.sleep(0.0002)
+        cache.drain_refreshes(timeout=1)
+        latencies.sort()
+        print(
+            "stale_ttl=%.1f: p50 %.3fms, p99 %.3fms, max %.3fms"
+            % (
+                stale_ttl,
+                latencies[len(latencies) // 2] * 1e3,
+                latencies[len(latencies) * 99 // 100] * 1e3,
+                latencies[-1] * 1e3,
+            )
+        )
+
+
+# 乱数で作ったアクセス列で、ArrayCacheとCacheの結果が同じことを確かめる
+def array_cache_test(traces: int = 300) -> None:
+    rng = random.Random(0)
+    for _ in range(traces):
+        n = rng.randint(0, 5)
+        max_bytes = rng.choice([None, rng.randint(1, 20)])
+        cache = Cache(n, max_bytes)
+        array_cache = ArrayCache(n, max_bytes)
+        for _ in range(50):
+            url = "%d.com" % rng.randrange(8)
+            contents = rng.choice("aあ") * rng.randint(0, 12)
+            assert cache.access_page(url, contents) == array_cache.access_page(
+                url, contents
+            )
+            assert cache.get_pages() == array_cache.get_pages()
+            assert cache.total_bytes == array_cache.total_bytes
+            assert cache.size == array_cache.size
+            assert cache.get_contents(url) == array_cache.get_contents(url)
+    print("ArrayCache tests passed!")
+
+
+# CacheとArrayCacheに同じアクセスをして、1秒あたりのアクセス数と、
+# 使ったメモリの最大を比べる
+def array_cache_benchmark(n: int = 10000, accesses: int = 1000000) -> None:
+    rng = random.Random(0)
+    # 一部のページに多くのアクセスが集まるアクセス列
+    urls = ["page%d.com" % int(rng.paretovariate(0.3)) for _ in range(accesses)]
+    for cache_class in [Cache, ArrayCache]:
+        cache = cache_class(n)
+        begin = time.time()
+        for url in urls:
+            cache.access_page(url, url)
+        end = time.time()
+
+        tracemalloc.start()
+        cache = cache_class(n)
+        for url in urls[: accesses // 5]:
+            cache.access_page(url, url)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(
+            "%-10s %8.0f accesses/s, peak memory %.1f MB"
+            % (cache_class.__name__, accesses / (end - begin), peak / 1e6)
+        )
 
 
 if __name__ == "__main__":
-    cache_test()
+    for cache_class in [Cache, ArrayCache]:
+        cache_test(cache_class)
+        byte_budget_test(cache_class)
+    array_cache_test()
+    array_cache_benchmark()
+    cache_test(ExpiringCache)
+    byte_budget_test(ExpiringCache)
+    expiry_test()
+    stale_while_revalidate_benchmark()
 
 
 # urlによってページが違うものがあった場合は？
@@ -0,0 +1,262 @@
+from __future__ import annotations
+import os, random, sys, tempfile
+
+from hw4_cache import Cache
+
+# LRUキャッシュ(hw4_cache.Cache)のヒット率を、1からmax_sizeまでのすべての
+# 大きさについて、アクセスログを1回読むだけで求める。
+#
+# あるURLの前回のアクセスから今回までにアクセスされた、違うURLの数+1を
+# スタック距離という。大きさnのLRUキャッシュでヒットするのは、スタック距離が
+# n以下のアクセスだけなので、スタック距離の分布が分かれば、すべての大きさの
+# ヒット率が分かる。
+#
+# スタック距離は、URLごとに最後にアクセスした時刻に印をつけ、前回の時刻より
+# 後にある印の数をFenwick木(Binary Indexed Tree)で数えて求める(O(log n))。
+# 時刻の数はアクセスログの長さだけ増えるが、max_sizeより深いURLはどの大きさ
+# でもヒットしないので忘れてよい。時刻を使い切ったら、新しい方からmax_size個の
+# 印だけを残して時刻を振り直す(compaction)。これでメモリはmax_sizeに比例する
+# だけになり、10^8回のアクセスのログもディスクから読みながら処理できる。
+#
+# python stack_distance.py trace_file [--max-size=N] [--output=curve.csv]
+#                          [--verify]
+# trace_fileは1行に1つURLを書いたファイル。--verifyをつけると、小さな大きさに
+# ついてCacheで実際にアクセスし直して、ヒット数が同じことを確かめる。
+# trace_fileを指定しなければ、テストを実行する。
+
+
+# Fenwick木(Binary Indexed Tree)。位置0〜size-1の値の、先頭からの和をO(log n)で求める。
+class FenwickTree:
+    def __init__(self: FenwickTree, size: int):
+        self.size = size
+        self.tree = [0] * (size + 1)
+
+    # 位置iの値にdeltaを足す
+    def add(self: FenwickTree, i: int, delta: int) -> None:
+        i += 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    # 位置0〜iの値の和を返す
+    def prefix_sum(self: FenwickTree, i: int) -> int:
+        i += 1
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    # 位置0〜size-1の値がvaluesになるように、O(size)で作り直す
+    def rebuild(self: FenwickTree, values: list) -> None:
+        tree = [0] + values + [0] * (self.size - len(values))
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                tree[parent] += tree[i]
+        self.tree = tree
+
+
+# アクセスを1つずつ受け取って、スタック距離の分布を数える。
+#
+# |self.last_access|: url -> そのURLに最後にアクセスした時刻(位置)
+# |self.urls|: self.urls[位置] はその時刻にアクセスしたURL。
+#              その後にまたアクセスされたらNone
+# |self.marks|: 印(最後のアクセスの時刻)の位置に1を持つFenwick木
+# |self.distance_counts|: self.distance_counts[d] はスタック距離がdのアクセスの数
+#                        (d > max_size や初めてのアクセスは数えない)
+class StackDistanceCounter:
+    def __init__(self: StackDistanceCounter, max_size: int):
+        # max_sizeが0だと、compactionで印を1つも捨てられない
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1: %d" % max_size)
+        self.max_size = max_size
+        self.capacity = 4 * max_size + 16
+        self.last_access = {}
+        self.urls = [None] * self.capacity
+        self.marks = FenwickTree(self.capacity)
+        self.live = 0  # 印の数
+        self.time = 0  # 次のアクセスの位置
+        self.distance_counts = [0] * (max_size + 1)
+        self.accesses = 0
+
+    # urlへのアクセスを記録して、スタック距離を返す
+    # (初めてのアクセスやmax_sizeより深いときはNone)
+    def access(self: StackDistanceCounter, url: str) -> int:
+        self.accesses += 1
+        if self.time == self.capacity:
+            self._compact()
+
+        distance = None
+        previous = self.last_access.get(url)
+        if previous is not None:
+            # 前回より後にアクセスされたURLの数 + 1
+            distance = self.live - self.marks.prefix_sum(previous) + 1
+            self.marks.add(previous, -1)
+            self.urls[previous] = None
+            self.live -= 1
+            if distance <= self.max_size:
+                self.distance_counts[distance] += 1
+            else:
+                distance = None
+
+        self.last_access[url] = self.time
+        self.urls[self.time] = url
+        self.marks.add(self.time, 1)
+        self.live += 1
+        self.time += 1
+        return distance
+
+    # 新しい方からmax_size個の印だけを残して、位置0から詰め直す
+    def _compact(self: StackDistanceCounter) -> None:
+        live_urls = [url for url in self.urls if url is not None]
+        for url in live_urls[: -self.max_size]:
+            del self.last_access[url]
+        live_urls = live_urls[-self.max_size :]
+        self.urls = live_urls + [None] * (self.capacity - len(live_urls))
+        for position, url in enumerate(live_urls):
+            self.last_access[url] = position
+        self.marks.rebuild([1] * len(live_urls))
+        self.live = len(live_urls)
+        self.time = len(live_urls)
+
+    # hit_counts()[n] は大きさnのLRUキャッシュでヒットするアクセスの数
+    def hit_counts(self: StackDistanceCounter) -> list:
+        counts = [0] * (self.max_size + 1)
+        total = 0
+        for n in range(1, self.max_size + 1):
+            total += self.distance_counts[n]
+            counts[n] = total
+        return counts
+
+
+# 1行に1つURLを書いたファイルを、1行ずつ読む
+def read_urls(path: str):
+    with open(path) as f:
+        for line in f:
+            url = line.strip()
+            if url:
+                yield url
+
+
+# urlsを1回読んで、(アクセスの数, 大きさ1〜max_sizeのヒット数のリスト)を返す
+def hit_ratio_curve(urls, max_size: int) -> tuple:
+    counter = StackDistanceCounter(max_size)
+    for url in urls:
+        counter.access(url)
+    return counter.accesses, counter.hit_counts()
+
+
+# 大きさ1〜max_sizeのヒット数とヒット率をCSVに書く。アクセスが1つもなければ
+# ヒット率は0にする
+def write_curve(path: str, accesses: int, hit_counts: list) -> None:
+    with open(path, "w") as f:
+        f.write("size,hits,hit_ratio\n")
+        for n in range(1, len(hit_counts)):
+            ratio = hit_counts[n] / accesses if accesses else 0
+            f.write("%d,%d,%.6f\n" % (n, hit_counts[n], ratio))
+
+
+# Cache(n)で実際にアクセスしたときのヒット数
+def replay_hits(urls, n: int) -> int:
+    cache = Cache(n)
+    hits = 0
+    for url in urls:
+        if cache.access_page(url, ""):
+            hits += 1
+    return hits
+
+
+# 大きさsizesのCacheのヒット数が、hit_countsと同じか確かめる
+def verify(path: str, hit_counts: list, sizes: list) -> None:
+    for n in sizes:
+        expected = replay_hits(read_urls(path), n)
+        assert hit_counts[n] == expected, "n=%d: %d != %d" % (
+            n,
+            hit_counts[n],
+            expected,
+        )
+        print("n=%d: %d hits (same as Cache)" % (n, expected))
+
+
+def stack_distance_test():
+    # 小さなFenwick木
+    tree = FenwickTree(10)
+    for i, value in enumerate([3, 1, 4, 1, 5]):
+        tree.add(i, value)
+    assert [tree.prefix_sum(i) for i in range(5)] == [3, 4, 8, 9, 14]
+    tree.rebuild([3, 1, 4, 1, 5])
+    assert [tree.prefix_sum(i) for i in range(5)] == [3, 4, 8, 9, 14]
+
+    counter = StackDistanceCounter(4)
+    distances = [counter.access(url) for url in "abcbaad"]
+    assert distances == [None, None, None, 2, 3, 1, None]
+    try:
+        StackDistanceCounter(0)
+        assert False
+    except ValueError:
+        pass
+
+    # すべての大きさで、Cacheのヒット数と同じ。max_sizeを小さくして、
+    # compactionが何度も起こるようにする
+    rng = random.Random(0)
+    urls = ["%d.com" % int(rng.paretovariate(1.2)) for _ in range(5000)]
+    accesses, hit_counts = hit_ratio_curve(urls, 16)
+    assert accesses == len(urls)
+    for n in range(1, 17):
+        assert hit_counts[n] == replay_hits(urls, n), n
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "trace.txt")
+        with open(path, "w") as f:
+            f.write("\n".join(urls) + "\n")
+        accesses, hit_counts = hit_ratio_curve(read_urls(path), 64)
+        for n in [1, 8, 64]:
+            assert hit_counts[n] == replay_hits(urls, n), n
+
+        # 空のファイル・空白だけのファイルでは、ヒット率を0にしてCSVを書ける
+        for text in ["", "\n  \n"]:
+            with open(path, "w") as f:
+                f.write(text)
+            accesses, hit_counts = hit_ratio_curve(read_urls(path), 4)
+            assert accesses == 0
+            assert hit_counts == [0] * 5
+            output = os.path.join(tmp, "curve.csv")
+            write_curve(output, accesses, hit_counts)
+            with open(output) as f:
+                lines = f.read().splitlines()
+            assert lines[0] == "size,hits,hit_ratio"
+            assert lines[1:] == ["%d,0,0.000000" % n for n in range(1, 5)]
+    print("Stack distance tests passed!")
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    options = {"max-size": "1000", "output": None}
+    for arg in sys.argv[1:]:
+        if arg.startswith("--") and "=" in arg:
+            name, value = arg[2:].split("=", 1)
+            options[name] = value
+    if not args:
+        stack_distance_test()
+        sys.exit(0)
+    if len(args) != 1:
+        print(
+            "Usage: python stack_distance.py trace_file [--max-size=N]"
+            " [--output=curve.csv] [--verify]"
+        )
+        sys.exit(1)
+
+    max_size = int(options["max-size"])
+    accesses, hit_counts = hit_ratio_curve(read_urls(args[0]), max_size)
+    if options["output"]:
+        write_curve(options["output"], accesses, hit_counts)
+    # 2倍ずつの大きさだけ表示する
+    n = 1
+    while True:
+        print("%10d %8.2f%%" % (n, 100 * hit_counts[n] / accesses if accesses else 0))
+        if n == max_size:
+            break
+        n = min(2 * n, max_size)
+    if "--verify" in sys.argv[1:]:
+        verify(args[0], hit_counts, [n for n in [1, 2, 4, 8, 16, 32] if n <= max_size])